@@ -0,0 +1,397 @@
+"""ASGI entry point with an async chat pipeline.
+
+/chat and /chat/stream run on AsyncAnthropic over one shared connection pool,
+so a visitor waiting on Claude only costs a coroutine, not a whole worker.
+Database work still goes through the Flask-SQLAlchemy code in app2, in a
+thread. Every other route is the regular Flask app behind an ASGI adapter.
+
+Run with:  uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from http.cookies import SimpleCookie
+
+import httpx
+from anthropic import AsyncAnthropic
+from asgiref.wsgi import WsgiToAsgi
+from rate_limit import LocalLimiterStore, ModelBusy
+from command_router import CHEAP, command_router
+from logging_setup import new_request_id
+from model_tier import FULL
+from upstream import Deadline, UpstreamUnavailable, acall_upstream
+
+import app2
+from app2 import (
+    ANTHROPIC_BUSY_ON,
+    ANTHROPIC_RETRY_ON,
+    BUSY_REPLY,
+    EMPTY_REPLY,
+    CHAT_REQUEST_BUDGET,
+    MODEL_CALL_TIMEOUT,
+    UPSTREAM_FALLBACK_REPLY,
+    StreamAccumulator,
+    cached_shared_reply,
+    check_admission,
+    choose_model_tier,
+    finish_chat_turn,
+    handle_chat_command,
+    memory_queue,
+    memory_writes,
+    model_call_seconds,
+    model_gate,
+    new_tool_loop,
+    prepare_chat_turn,
+    record_cache_usage,
+    record_model_usage,
+    record_tool_loop,
+    request_seconds,
+    share_reply,
+    sse_event,
+    stage_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+flask_app = app2.app
+flask_asgi = WsgiToAsgi(flask_app)
+
+# One pool for all concurrent visitors; Anthropic calls are long, so keep it generous.
+ANTHROPIC_MAX_CONNECTIONS = int(os.environ.get("ANTHROPIC_MAX_CONNECTIONS", 100))
+
+async_client = None
+
+
+def get_async_client():
+    """Create the shared AsyncAnthropic client on first use (inside the event loop)"""
+    global async_client
+    if async_client is None and app2.anthropic_key:
+        async_client = AsyncAnthropic(
+            api_key=app2.anthropic_key.strip(),
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=ANTHROPIC_MAX_CONNECTIONS,
+                    max_keepalive_connections=ANTHROPIC_MAX_CONNECTIONS // 2,
+                ),
+                timeout=httpx.Timeout(600.0, connect=5.0),
+            ),
+        )
+    return async_client
+
+
+def in_app_context(func, *args):
+    """Run func with a Flask app context (its own DB session), for use in a worker thread"""
+    with flask_app.app_context():
+        return func(*args)
+
+
+def prepare_turn(user_id, user_input):
+    # The ORM object cannot cross threads, so only the prompt pieces and the turn count come back.
+    user_history, system_prompt, conversation_messages = prepare_chat_turn(user_id, user_input)
+    return system_prompt, conversation_messages, user_history['conversation_count']
+
+
+def finish_turn(user_id, user_input, ai_response):
+    finish_chat_turn(user_id, user_input, ai_response)
+
+
+# ============================================================================
+# SESSION COOKIE (same signed cookie Flask uses, so both servers agree)
+# ============================================================================
+
+def resolve_user_id(scope, payload):
+    """Same rules as app2.resolve_user_id. Returns (user_id, set_cookie_header or None)."""
+    user_id_from_request = payload.get('user_id')
+    if user_id_from_request and user_id_from_request != 'anonymous':
+        return user_id_from_request, None
+
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    cookies = SimpleCookie()
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            cookies.load(value.decode("latin-1"))
+
+    session_data = {}
+    if cookie_name in cookies:
+        try:
+            session_data = serializer.loads(cookies[cookie_name].value)
+        except Exception:
+            session_data = {}
+
+    if 'user_id' in session_data:
+        return session_data['user_id'], None
+
+    session_data['user_id'] = f'exhibition_user_{uuid.uuid4().hex[:12]}_{int(datetime.now().timestamp())}'
+    logger.info("🆕 New session user_id created: %s", session_data['user_id'])
+    cookie = f"{cookie_name}={serializer.dumps(session_data)}; Path=/; HttpOnly; SameSite=Lax"
+    return session_data['user_id'], cookie
+
+
+# ============================================================================
+# ASYNC MODEL CALLS
+# ============================================================================
+
+# Chat calls on this server wait for app2.model_gate slots on the event loop;
+# Flask routes and memory extraction use the same slots from threads.
+
+
+async def acreate_message(deadline, **params):
+    """Async twin of app2.create_message"""
+    client = get_async_client()
+    async with model_gate.aslot():
+        with model_call_seconds.time(model=params.get("model")):
+            response = await acall_upstream(
+                "anthropic",
+                lambda timeout: client.messages.create(timeout=timeout, **params),
+                deadline=deadline,
+                attempt_timeout=MODEL_CALL_TIMEOUT,
+                retry_on=ANTHROPIC_RETRY_ON,
+                busy_on=ANTHROPIC_BUSY_ON,
+            )
+    record_model_usage(params.get("model"), getattr(response, "usage", None))
+    return response
+
+
+async def agenerate_chat_reply(system_prompt, conversation_messages, tier=FULL):
+    """Async twin of app2.generate_chat_reply"""
+    deadline = Deadline(CHAT_REQUEST_BUDGET)
+    loop = new_tool_loop(system_prompt, conversation_messages, tier)
+    while True:
+        with stage_seconds.time(stage=loop.stage):
+            response = await acreate_message(deadline, **loop.request())
+        usage = getattr(response, "usage", None)
+        record_cache_usage(usage)
+        if not loop.absorb(response.content, response.stop_reason, usage):
+            break
+    record_tool_loop(loop)
+    logger.debug("📊 Response stop_reason: %s", loop.stop_reason)
+    return loop.text()
+
+
+async def astream_model_round(params, accumulator, deadline):
+    """Async twin of app2.stream_model_round; yields text deltas into accumulator"""
+    client = get_async_client()
+    async with model_gate.aslot():
+        with model_call_seconds.time(model=params.get("model")):
+            stream = await acall_upstream(
+                "anthropic",
+                lambda timeout: client.messages.create(timeout=timeout, stream=True, **params),
+                deadline=deadline,
+                attempt_timeout=MODEL_CALL_TIMEOUT,
+                retry_on=ANTHROPIC_RETRY_ON,
+                busy_on=ANTHROPIC_BUSY_ON,
+            )
+            async for event in stream:
+                text = accumulator.feed(event)
+                if text:
+                    yield text
+
+
+# ============================================================================
+# ASGI PLUMBING
+# ============================================================================
+
+async def read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    return json.loads(body or b"{}")
+
+
+async def send_json(send, payload, status=200, cookie=None, headers=()):
+    headers = [(b"content-type", b"application/json"), *headers]
+    if cookie:
+        headers.append((b"set-cookie", cookie.encode("latin-1")))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": json.dumps(payload, ensure_ascii=False).encode()})
+
+
+# Buckets in this process answer in microseconds; a shared store (Redis) is a
+# network round trip per request, so it is asked from a worker thread.
+ADMISSION_OFF_LOOP = not isinstance(app2.limiter_store, LocalLimiterStore)
+
+
+async def start_turn(scope, receive, send, label):
+    """Shared preamble of both chat routes.
+
+    Returns (user_id, user_input, cookie, command), or None if the request
+    was already answered with an error. command is the routed tool command
+    or None; run it with run_command inside the route's error handling.
+    """
+    logger.debug("📨 REQUEST: POST %s", scope['path'])
+    payload = await read_json(receive)
+    user_input = payload.get('message')
+    user_id, cookie = resolve_user_id(scope, payload)
+    logger.info("🤖 %s from %s (async)", label, user_id)
+    logger.debug("📨 User message: '%s'", user_input)
+
+    command = command_router.route(user_input)
+    if get_async_client() is None and (command is None or command.command.needs_model):
+        await send_json(send, {
+            "error": "ANTHROPIC_API_KEY is not configured on the server.",
+            "response": "Server is missing AI provider key. Set ANTHROPIC_API_KEY in deployment environment variables."
+        }, status=503, cookie=cookie)
+        return None
+
+    if ADMISSION_OFF_LOOP:
+        rejected = await asyncio.to_thread(check_admission, user_id)
+    else:
+        rejected = check_admission(user_id)
+    if rejected is not None:
+        payload, status, headers = rejected
+        await send_json(send, payload, status=status, cookie=cookie,
+                        headers=[(k.lower().encode(), v.encode()) for k, v in headers.items()])
+        return None
+
+    return user_id, user_input, cookie, command
+
+
+async def run_command(command):
+    """handle_chat_command for the event loop"""
+    # Cheap commands run inline; ones that wait on I/O or the (sync) model client get a thread.
+    if command is None or command.command.cost == CHEAP:
+        return handle_chat_command(command)
+    return await asyncio.to_thread(handle_chat_command, command)
+
+
+async def chat(scope, receive, send):
+    started = await start_turn(scope, receive, send, "CHAT REQUEST")
+    if started is None:
+        return
+    user_id, user_input, cookie, command = started
+
+    turn_started = time.perf_counter()
+    try:
+        command_reply = await run_command(command)
+        if command_reply is not None:
+            await send_json(send, command_reply, cookie=cookie)
+            return
+
+        system_prompt, conversation_messages, conversation_count = await asyncio.to_thread(
+            in_app_context, prepare_turn, user_id, user_input)
+        ai_response = cached_shared_reply(conversation_count, user_input)
+        if ai_response is None:
+            ai_response = await agenerate_chat_reply(system_prompt, conversation_messages, choose_model_tier(user_input))
+            ai_response = ai_response or EMPTY_REPLY
+            share_reply(conversation_count, user_input, ai_response)
+        logger.debug("📥 Response from Lisbeth: '%s...'", ai_response[:80])
+        await asyncio.to_thread(in_app_context, finish_turn, user_id, user_input, ai_response)
+        request_seconds.observe(time.perf_counter() - turn_started, route="/chat")
+        await send_json(send, {"response": ai_response}, cookie=cookie)
+    except ModelBusy as e:
+        logger.info("🚦 Model busy: %s", e)
+        await send_json(send, {"response": BUSY_REPLY}, status=503, cookie=cookie, headers=[(b"retry-after", b"5")])
+    except UpstreamUnavailable as e:
+        logger.info("⚡ %s", e)
+        await send_json(send, {"response": UPSTREAM_FALLBACK_REPLY, "degraded": True}, cookie=cookie)
+    except Exception as e:
+        logger.error("❌ ERROR: %s", e)
+        await send_json(send, {"error": str(e)}, status=500, cookie=cookie)
+
+
+async def chat_stream(scope, receive, send):
+    started = await start_turn(scope, receive, send, "CHAT STREAM REQUEST")
+    if started is None:
+        return
+    user_id, user_input, cookie, command = started
+
+    headers = [
+        (b"content-type", b"text/event-stream; charset=utf-8"),
+        (b"cache-control", b"no-cache"),
+        (b"x-accel-buffering", b"no"),
+    ]
+    if cookie:
+        headers.append((b"set-cookie", cookie.encode("latin-1")))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    async def emit(event, data, more=True):
+        await send({"type": "http.response.body", "body": sse_event(event, data).encode(), "more_body": more})
+
+    turn_started = time.perf_counter()
+    try:
+        command_reply = await run_command(command)
+        if command_reply is not None:
+            await emit("done", command_reply, more=False)
+            return
+
+        system_prompt, conversation_messages, conversation_count = await asyncio.to_thread(
+            in_app_context, prepare_turn, user_id, user_input)
+
+        ai_response = cached_shared_reply(conversation_count, user_input)
+        if ai_response is not None:
+            await emit("token", {"text": ai_response})
+        else:
+            deadline = Deadline(CHAT_REQUEST_BUDGET)
+            loop = new_tool_loop(system_prompt, conversation_messages, choose_model_tier(user_input))
+            while True:
+                accumulator = StreamAccumulator()
+                with stage_seconds.time(stage=loop.stage):
+                    async for text in astream_model_round(loop.request(), accumulator, deadline):
+                        await emit("token", {"text": text})
+                if not loop.absorb(accumulator.blocks, accumulator.stop_reason, accumulator.usage):
+                    break
+            record_tool_loop(loop)
+            ai_response = loop.text() or EMPTY_REPLY
+            share_reply(conversation_count, user_input, ai_response)
+        logger.debug("📥 Response from Lisbeth: '%s...'", ai_response[:80])
+        await asyncio.to_thread(in_app_context, finish_turn, user_id, user_input, ai_response)
+        request_seconds.observe(time.perf_counter() - turn_started, route="/chat/stream")
+        await emit("done", {"response": ai_response}, more=False)
+    except ModelBusy as e:
+        logger.info("🚦 Model busy: %s", e)
+        await emit("done", {"response": BUSY_REPLY}, more=False)
+    except UpstreamUnavailable as e:
+        logger.info("⚡ %s", e)
+        await emit("done", {"response": UPSTREAM_FALLBACK_REPLY, "degraded": True}, more=False)
+    except Exception as e:
+        logger.error("❌ ERROR: %s", e)
+        await emit("error", {"error": str(e)}, more=False)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if async_client is not None:
+                await async_client.close()
+            drain_timeout = float(os.environ.get("MEMORY_DRAIN_TIMEOUT", 10))
+            await asyncio.to_thread(memory_writes.shutdown, drain_timeout)
+            await asyncio.to_thread(memory_queue.shutdown, drain_timeout)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+ASYNC_ROUTES = {
+    "/chat": chat,
+    "/chat/stream": chat_stream,
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    handler = ASYNC_ROUTES.get(scope.get("path"))
+    if scope["type"] == "http" and scope["method"] == "POST" and handler is not None:
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        request_id = new_request_id(incoming).encode()
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id)]
+            await send(message)
+
+        await handler(scope, receive, send_with_request_id)
+        return
+    await flask_asgi(scope, receive, send)
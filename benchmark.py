@@ -0,0 +1,618 @@
+"""Offline load test and latency benchmark for app2.
+
+Runs the Flask app in-process against local stand-ins, so no API key,
+network access or real feeds are needed:
+- BenchAnthropic replays recorded replies (chat, web search rounds, memory
+  extraction, OSINT evaluation) with configurable latency and tool use,
+- StubServer serves the RSS feeds and the pwnedpasswords range API.
+
+A pool of threads replays a weighted mix of visitor actions. The run ends
+with p50/p95/p99 per action, requests/s, DB commits and token usage. With
+--save-baseline the summary is stored; later runs are compared against it
+and exit with status 1 on a regression beyond --tolerance.
+
+    python benchmark.py --requests 400 --concurrency 8
+    python benchmark.py --save-baseline
+    python benchmark.py --mix chat=80,search=20 --tool-use-rate 0.5
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+DEFAULT_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+
+# Relative weights of visitor actions; roughly what the exhibition terminal sees
+DEFAULT_MIX = {
+    "chat": 50,
+    "chat_stream": 10,
+    "check_password": 10,
+    "breach_check": 5,
+    "search": 8,
+    "security_news": 9,
+    "user_memory": 8,
+}
+
+# Latency differences below this are noise, not regressions (seconds)
+NOISE_FLOOR = 0.005
+# Actions with fewer samples are shown against the baseline but never fail the run
+MIN_SAMPLES = 20
+
+RECORDED_REPLIES = {
+    "chat": [
+        "You want honesty? Fine. Your threat model is a sticky note on the monitor.",
+        "Privacy isn't something you have, it's something you keep taking back. Every day.",
+        "Nobody hacks the firewall. They phone the receptionist and ask nicely.",
+        "I don't trust systems I can't read. I trust people even less.",
+        "Reuse that password one more time and I'll start reading your mail for practice.",
+    ],
+    "web_search_intro": [
+        "Let me dig through what's out there.",
+        "Give me a second, I'll pull the public record.",
+    ],
+    "web_search_answer": [
+        "Found it. Three advisories this week, two of them already exploited in the wild.",
+        "The vendor patched it quietly last month. Nobody bothered to tell the users.",
+    ],
+    "extraction": [
+        {"profile": {"name": None, "interests": ["security"], "occupation": None},
+         "topic": {"main_topic": "password hygiene", "summary": "Visitor asked how passwords get cracked",
+                   "key_positions": ["reuses passwords"], "key_points": ["dictionary attacks"]}},
+        {"profile": {"interests": ["privacy", "surveillance"]},
+         "topic": {"main_topic": "surveillance", "summary": "Talked about cameras in public spaces",
+                   "key_positions": ["dislikes CCTV"], "key_points": ["face recognition"]}},
+        {"profile": {"occupation": "student"},
+         "topic": {"main_topic": "hacking culture", "summary": "Asked about how hackers work",
+                   "key_positions": [], "key_points": ["social engineering"]}},
+    ],
+    "osint": [
+        "PUBLICITY SCORE: 3/10\n\nA couple of forum posts and an abandoned profile. Sloppy, but not famous.",
+        "PUBLICITY SCORE: 10/10\n\nEvery move indexed, archived and mirrored. There is no off switch.",
+    ],
+}
+
+VISITOR_MESSAGES = [
+    "how do hackers guess passwords",
+    "are the cameras in this room recording me",
+    "what is the latest ransomware news",
+    "can you find out who I am",
+    "tell me about social engineering",
+    "is my phone listening to me",
+    "what would you do if you were me",
+    "hi",
+    "who are you",
+    "thanks!",
+    "ok cool",
+]
+
+SAMPLE_PASSWORDS = ["hunter2", "password123", "Tr0ub4dor&3", "correct horse battery staple",
+                    "qwerty", "iloveyou", "Xk9#mQ2$vL8!", "summer2024"]
+
+SEARCH_TARGETS = ["Lisbeth Salander", "Elon Musk", "jane.doe@example.com", "Mikael Blomkvist", "Taylor Swift"]
+
+
+# ============================================================================
+# ANTHROPIC STAND-IN
+# ============================================================================
+
+class _Block:
+    """Content block with the attribute and model_dump() access app2 uses"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def model_dump(self, exclude_none=False):
+        return {k: v for k, v in self.__dict__.items() if not (exclude_none and v is None)}
+
+
+def _estimate_tokens(value):
+    return max(1, len(json.dumps(value, default=str, ensure_ascii=False)) // 4)
+
+
+def _prompt_parts(params):
+    """(system and message content blocks in request order, indexes of the cache breakpoints)
+
+    Blocks are normalized the way the cache sees them: a string is one text
+    block, and cache_control is not part of the content.
+    """
+    raw = []
+    system = params.get("system")
+    raw.extend(system if isinstance(system, list) else [system])
+    for message in params.get("messages", []):
+        content = message.get("content")
+        raw.extend(content if isinstance(content, list) else [{"type": "text", "text": content}])
+    parts, breakpoints = [], []
+    for i, part in enumerate(raw):
+        if isinstance(part, dict):
+            if part.get("cache_control"):
+                breakpoints.append(i)
+            part = {k: v for k, v in part.items() if k != "cache_control"}
+        parts.append(part)
+    return parts, breakpoints
+
+
+def _prefix_key(parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+# Like Anthropic, a breakpoint also reads a prefix cached by an earlier
+# request that ended up to this many blocks before it.
+CACHE_LOOKBACK_BLOCKS = 20
+
+
+class BenchAnthropic:
+    """Drop-in for anthropic.Anthropic: replays RECORDED_REPLIES after a simulated delay.
+
+    latency maps a call kind (chat, fast_chat, web_search, extraction, osint) to mean
+    seconds; each call varies by +-jitter of that. A chat call stops with
+    tool_use at tool_use_rate, and the follow-up round returns the answer.
+    """
+
+    def __init__(self, replies=None, latency=None, jitter=0.3, tool_use_rate=0.15, seed=0):
+        self.replies = replies or RECORDED_REPLIES
+        self.latency = latency or {}
+        self.jitter = jitter
+        self.tool_use_rate = tool_use_rate
+        self.messages = self
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._cached = set()
+        self._lock = threading.Lock()
+
+    def _pick(self, kind):
+        with self._lock:
+            self.calls += 1
+            return self._rng.choice(self.replies[kind])
+
+    def _chance(self, rate):
+        with self._lock:
+            return self._rng.random() < rate
+
+    def _delay(self, kind):
+        mean = self.latency.get(kind, 0.0)
+        with self._lock:
+            factor = 1 + self.jitter * (2 * self._rng.random() - 1)
+        return max(0.0, mean * factor)
+
+    def _usage(self, params, output_text):
+        prompt_tokens = _estimate_tokens([params.get("system"), params.get("messages")])
+        cache_read = cache_write = 0
+        parts, breakpoints = _prompt_parts(params)
+        if breakpoints:
+            end = breakpoints[-1] + 1
+            prefix_tokens = _estimate_tokens(parts[:end])
+            if prefix_tokens >= 1024:
+                with self._lock:
+                    read_end = next((i for i in range(end, max(0, end - CACHE_LOOKBACK_BLOCKS), -1)
+                                     if _prefix_key(parts[:i]) in self._cached), 0)
+                    self._cached.add(_prefix_key(parts[:end]))
+                cache_read = _estimate_tokens(parts[:read_end]) if read_end else 0
+                cache_write = prefix_tokens - cache_read if read_end < end else 0
+                prompt_tokens -= prefix_tokens
+        return SimpleNamespace(
+            input_tokens=max(1, prompt_tokens),
+            output_tokens=_estimate_tokens(output_text),
+            cache_read_input_tokens=cache_read,
+            cache_creation_input_tokens=cache_write,
+        )
+
+    def _reply(self, params):
+        """(kind, content blocks, stop_reason) for one call"""
+        system = json.dumps(params.get("system"), default=str)
+        if params.get("tools"):
+            messages = params.get("messages", [])
+            follow_up = messages and messages[-1].get("role") == "assistant"
+            if follow_up:
+                return "web_search", [_Block(type="text", text=self._pick("web_search_answer"))], "end_turn"
+            if self._chance(self.tool_use_rate):
+                return "chat", [
+                    _Block(type="text", text=self._pick("web_search_intro")),
+                    _Block(type="server_tool_use", id="srvtoolu_bench", name="web_search",
+                           input={"query": str(messages[-1].get("content"))[:60]}),
+                ], "tool_use"
+            return "chat", [_Block(type="text", text=self._pick("chat"))], "end_turn"
+        if "PUBLICITY SCORE" in system:
+            return "osint", [_Block(type="text", text=self._pick("osint"))], "end_turn"
+        if isinstance(params.get("system"), list):
+            # The chat system prompt is content blocks; without tools it is the fast tier.
+            return "fast_chat", [_Block(type="text", text=self._pick("chat"))], "end_turn"
+        return "extraction", [_Block(type="text", text=json.dumps(self._pick("extraction")))], "end_turn"
+
+    def create(self, stream=False, timeout=None, **params):
+        kind, content, stop_reason = self._reply(params)
+        text = " ".join(getattr(b, "text", "") for b in content)
+        usage = self._usage(params, text)
+        delay = self._delay(kind)
+        model = params.get("model", "unknown")
+        if stream:
+            return self._stream(model, content, stop_reason, usage, delay)
+        time.sleep(delay)
+        return SimpleNamespace(model=model, content=content, stop_reason=stop_reason, usage=usage)
+
+    def _stream(self, model, content, stop_reason, usage, delay):
+        """Stream events as app2.StreamAccumulator reads them; a third of the delay before the first token"""
+        time.sleep(delay / 3)
+        start_usage = SimpleNamespace(**dict(vars(usage), output_tokens=1))
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(model=model, usage=start_usage))
+        chunks = [(i, w) for i, b in enumerate(content) if b.type == "text" for w in b.text.split(" ")]
+        pause = (2 * delay / 3) / max(1, len(chunks))
+        for index, block in enumerate(content):
+            if block.type != "text":
+                yield SimpleNamespace(type="content_block_start", index=index,
+                                      content_block=_Block(type=block.type, id=block.id, name=block.name, input={}))
+                yield SimpleNamespace(type="content_block_delta", index=index,
+                                      delta=SimpleNamespace(type="input_json_delta",
+                                                            partial_json=json.dumps(block.input)))
+            else:
+                yield SimpleNamespace(type="content_block_start", index=index,
+                                      content_block=_Block(type="text", text=""))
+                for i, word in chunks:
+                    if i == index:
+                        time.sleep(pause)
+                        yield SimpleNamespace(type="content_block_delta", index=index,
+                                              delta=SimpleNamespace(type="text_delta", text=word + " "))
+            yield SimpleNamespace(type="content_block_stop", index=index)
+        yield SimpleNamespace(type="message_delta", delta=SimpleNamespace(stop_reason=stop_reason),
+                              usage=SimpleNamespace(output_tokens=usage.output_tokens))
+        yield SimpleNamespace(type="message_stop")
+
+
+# ============================================================================
+# FEED AND PWNEDPASSWORDS STUBS
+# ============================================================================
+
+def _rss(feed_index):
+    items = "".join(
+        f"<item><title>Ransomware attack #{feed_index}-{i} hits another vendor</title>"
+        f"<link>https://news.example.com/{feed_index}/{i}</link>"
+        f"<description>Security researchers found a new exploit.</description>"
+        f"<pubDate>Mon, 0{1 + i % 9} Sep 2025 10:00:00 GMT</pubDate></item>"
+        for i in range(8)
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {feed_index}</title>{items}</channel></rss>'
+
+
+def _pwned_range(prefix):
+    """A range response like api.pwnedpasswords.com's, with the sample passwords in it"""
+    rng = random.Random(prefix)
+    lines = {"".join(rng.choice("0123456789ABCDEF") for _ in range(35)): rng.randint(1, 500) for _ in range(800)}
+    for password in SAMPLE_PASSWORDS:
+        digest = hashlib.sha1(password.encode()).hexdigest().upper()
+        if digest.startswith(prefix) and "Xk9" not in password:
+            lines[digest[5:]] = 12345
+    return "\r\n".join(f"{suffix}:{count}" for suffix, count in sorted(lines.items()))
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path.startswith("/feed/"):
+            body, content_type = _rss(self.path.split("/")[2].split(".")[0]), "application/rss+xml"
+        elif self.path.startswith("/range/"):
+            body, content_type = _pwned_range(self.path.split("/")[2].upper()), "text/plain"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer:
+    """Local HTTP server for the RSS feeds and the pwnedpasswords range API"""
+
+    def __init__(self, latency=0.0):
+        handler = type("Handler", (_StubHandler,), {"latency": latency})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, name="bench-stubs", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        return False
+
+
+# ============================================================================
+# LOAD GENERATOR
+# ============================================================================
+
+def _chat(client, rng, user_id):
+    return client.post("/chat", json={"message": rng.choice(VISITOR_MESSAGES), "user_id": user_id})
+
+
+def _chat_stream(client, rng, user_id):
+    response = client.post("/chat/stream", json={"message": rng.choice(VISITOR_MESSAGES), "user_id": user_id})
+    response.get_data()
+    return response
+
+
+def _check_password(client, rng, user_id):
+    return client.post("/chat", json={"message": f"check password {rng.choice(SAMPLE_PASSWORDS)}",
+                                      "user_id": user_id})
+
+
+def _breach_check(client, rng, user_id):
+    return client.post("/check-password", json={"password": rng.choice(SAMPLE_PASSWORDS)})
+
+
+def _search(client, rng, user_id):
+    return client.post("/chat", json={"message": f"search {rng.choice(SEARCH_TARGETS)}", "user_id": user_id})
+
+
+def _security_news(client, rng, user_id):
+    return client.get("/security-news")
+
+
+def _user_memory(client, rng, user_id):
+    return client.get(f"/user-memory/{user_id}")
+
+
+ACTIONS = {
+    "chat": _chat,
+    "chat_stream": _chat_stream,
+    "check_password": _check_password,
+    "breach_check": _breach_check,
+    "search": _search,
+    "security_news": _security_news,
+    "user_memory": _user_memory,
+}
+
+
+def run_load(app, mix, total, concurrency, users, seed, warmup=0):
+    """Replay total requests from mix on concurrency threads. Returns ([(action, seconds, status)], wall seconds)."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples = []
+    samples_lock = threading.Lock()
+    issued = [0]
+
+    def next_index():
+        with samples_lock:
+            if issued[0] >= warmup + total:
+                return None
+            issued[0] += 1
+            return issued[0]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = app.test_client()
+        while (n := next_index()) is not None:
+            action = rng.choices(names, weights)[0]
+            user_id = f"bench-{rng.randrange(users)}"
+            started = time.perf_counter()
+            try:
+                status = ACTIONS[action](client, rng, user_id).status_code
+            except Exception as e:
+                print(f"⚠️ {action} raised {type(e).__name__}: {e}", file=sys.stderr)
+                status = 599
+            elapsed = time.perf_counter() - started
+            if n > warmup:
+                with samples_lock:
+                    samples.append((action, elapsed, status))
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"bench-{i}") for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+# ============================================================================
+# REPORT AND BASELINE
+# ============================================================================
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _latency_summary(latencies, wall):
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+def summarize(samples, wall, app2):
+    summary = {"overall": _latency_summary([s for _, s, _ in samples], wall), "actions": {}}
+    summary["overall"]["wall_seconds"] = round(wall, 2)
+    summary["overall"]["errors"] = sum(1 for *_, status in samples if status >= 500)
+    summary["overall"]["rejected"] = sum(1 for *_, status in samples if status == 429)
+    for action in sorted({a for a, _, _ in samples}):
+        rows = [(s, status) for a, s, status in samples if a == action]
+        stats = _latency_summary([s for s, _ in rows], wall)
+        stats["errors"] = sum(1 for _, status in rows if status >= 500)
+        summary["actions"][action] = stats
+
+    summary["db_commits"] = {
+        "committed": app2.db_commits.value(result="committed"),
+        "rolled_back": app2.db_commits.value(result="rolled_back"),
+    }
+    tokens = {}
+    for _, labels, value in app2.model_tokens.samples():
+        labels = dict(labels)
+        tokens.setdefault(labels["model"], {})[labels["kind"]] = value
+    summary["tokens"] = tokens
+    return summary
+
+
+def print_summary(summary):
+    overall = summary["overall"]
+    print(f"\n{'action':<16}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for action, stats in summary["actions"].items():
+        print(f"{action:<16}{stats['count']:>7}{stats['errors']:>5}{stats['p50'] * 1000:>10.1f}"
+              f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}{stats['rps']:>9.2f}")
+    print(f"{'TOTAL':<16}{overall['count']:>7}{overall['errors']:>5}{overall['p50'] * 1000:>10.1f}"
+          f"{overall['p95'] * 1000:>10.1f}{overall['p99'] * 1000:>10.1f}{overall['rps']:>9.2f}")
+    print(f"\n⏱️  {overall['wall_seconds']}s wall, {overall['rejected']} rate limited")
+    commits = summary["db_commits"]
+    print(f"💾 DB commits: {commits['committed']} committed, {commits['rolled_back']} rolled back")
+    for model, kinds in summary["tokens"].items():
+        print(f"🔢 {model}: " + ", ".join(f"{kind} {count}" for kind, count in sorted(kinds.items())))
+
+
+def compare(summary, baseline, tolerance):
+    """Lines describing regressions against baseline (empty if none)"""
+    if baseline.get("config") != summary.get("config"):
+        print("⚠️ Baseline was recorded with a different configuration; comparison is indicative only")
+    regressions = []
+    rows = [("TOTAL", summary["overall"], baseline["overall"])]
+    rows += [(a, s, baseline["actions"][a]) for a, s in summary["actions"].items() if a in baseline["actions"]]
+    print(f"\n{'vs baseline':<16}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}")
+    for name, new, old in rows:
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+            cells.append(f"{change:>+10.0%}")
+            if change > tolerance and new[key] - old[key] > NOISE_FLOOR and new["count"] >= MIN_SAMPLES:
+                regressions.append(f"{name} {key} {old[key] * 1000:.1f}ms -> {new[key] * 1000:.1f}ms")
+        change = (new["rps"] - old["rps"]) / old["rps"] if old["rps"] else 0.0
+        cells.append(f"{change:>+10.0%}")
+        if name == "TOTAL" and change < -tolerance:
+            regressions.append(f"throughput {old['rps']} -> {new['rps']} req/s")
+        print(f"{name:<16}" + "".join(cells))
+    return regressions
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action '{name}' (choose from {', '.join(ACTIONS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the chat app")
+    parser.add_argument("--requests", type=int, default=300, help="measured requests (default 300)")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests first (default 20)")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads (default 8)")
+    parser.add_argument("--users", type=int, default=40, help="distinct visitor ids (default 40)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="action weights, e.g. chat=50,search=10 (default: %(default)s)")
+    parser.add_argument("--chat-latency", type=float, default=0.8, help="Sonnet reply seconds (default 0.8)")
+    parser.add_argument("--fast-chat-latency", type=float, default=0.3,
+                        help="Haiku fast-tier reply seconds (default 0.3)")
+    parser.add_argument("--web-search-latency", type=float, default=1.5,
+                        help="web search follow-up seconds (default 1.5)")
+    parser.add_argument("--extraction-latency", type=float, default=0.4, help="Haiku extraction seconds (default 0.4)")
+    parser.add_argument("--osint-latency", type=float, default=0.6, help="OSINT evaluation seconds (default 0.6)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="latency varies by +- this fraction (default 0.3)")
+    parser.add_argument("--tool-use-rate", type=float, default=0.15,
+                        help="share of chat replies that search the web first (default 0.15)")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="feed / HIBP stub seconds (default 0.05)")
+    parser.add_argument("--replies", type=Path, help="JSON file of recorded replies (same keys as RECORDED_REPLIES)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline (default 0.2 = 20%%)")
+    parser.add_argument("--json", type=Path, help="also write the summary to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(workdir):
+    """Settings for app2 before it is imported: throwaway DB, no key, no rate limits, quiet logs"""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir / 'benchmark.db'}")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    os.environ.setdefault("NEWS_REFRESH_INTERVAL", "0")
+    os.environ.setdefault("USER_RATE_PER_MIN", "0")
+    os.environ.setdefault("GLOBAL_RATE_PER_SEC", "0")
+    os.environ.setdefault("PWNED_MODE", "online")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = Path(tempfile.mkdtemp(prefix="lisbeth-bench-"))
+    configure_environment(workdir)
+
+    import app2
+    import tools
+
+    replies = json.loads(args.replies.read_text()) if args.replies else None
+    app2.client = BenchAnthropic(
+        replies=replies,
+        latency={"chat": args.chat_latency, "fast_chat": args.fast_chat_latency,
+                 "web_search": args.web_search_latency,
+                 "extraction": args.extraction_latency, "osint": args.osint_latency},
+        jitter=args.jitter,
+        tool_use_rate=args.tool_use_rate,
+        seed=args.seed,
+    )
+    config = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+              if k not in ("baseline", "save_baseline", "tolerance", "json")}
+
+    with StubServer(args.stub_latency) as stubs:
+        tools.news_service.feeds = [f"{stubs.url}/feed/{i}.xml" for i in range(4)]
+        tools.PWNED_RANGE_URL = stubs.url + "/range/{}"
+        with app2.app.app_context():
+            app2.db.create_all()
+
+        print(f"🏁 {args.requests} requests, {args.concurrency} threads, {args.users} visitors, mix {args.mix}")
+        samples, wall = run_load(app2.app, args.mix, args.requests, args.concurrency, args.users,
+                                 args.seed, warmup=args.warmup)
+        # Write out buffered turns and finish queued extractions so their commits and tokens count.
+        app2.memory_writes.shutdown()
+        app2.memory_queue.shutdown()
+
+    summary = summarize(samples, wall, app2)
+    summary["config"] = config
+    print_summary(summary)
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(summary, indent=2))
+        print(f"\n📌 Baseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"\nℹ️  No baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    regressions = compare(summary, json.loads(args.baseline.read_text()), args.tolerance)
+    if regressions:
+        print("\n❌ Regressions beyond tolerance:")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print("\n✅ Within tolerance of the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
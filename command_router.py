@@ -0,0 +1,136 @@
+"""Routing of chat tool commands ("check password ...", "search ...").
+
+Commands register once, with the words they start with, whole phrases, or a
+regex. Phrases and regexes must cover the whole message (a leading "/" and
+trailing punctuation aside), so "Surveillance capitalism is ruining
+democracy" stays an ordinary chat message; prefixes are for commands that
+take an argument ("check password hunter2"). The router keeps them in dicts keyed by phrase and by first word, plus
+one combined regex, so routing a message costs a dict lookup and at most one
+regex match however many tools there are. It runs before any DB or model
+work; each command says whether it needs the model and how expensive it is,
+so callers can answer cheap commands even when the model is unavailable and
+push slow ones off the event loop.
+
+Tools plug in with the decorator:
+
+    @command_router.command("surveillance", prefixes=["surveillance"])
+    def surveillance_command(argument):
+        return {"response": ...}
+"""
+import re
+import threading
+
+# Command cost classes
+CHEAP = "cheap"   # pure CPU, answers in well under a millisecond
+IO = "io"         # may wait on the network or disk
+MODEL = "model"   # calls Anthropic
+
+
+_TRAILING_PUNCTUATION = ".!?… \t\n"
+
+
+def _phrase(text):
+    """text as an exact phrase key: lowercase, single spaces, no leading "/" or trailing punctuation"""
+    return " ".join(text.lower().split()).lstrip("/").rstrip(_TRAILING_PUNCTUATION)
+
+
+class Command:
+    """A tool the chat box can trigger.
+
+    handler(argument) returns the reply payload. argument is the text after
+    the prefix (original case), "" for exact phrases, and the whole message
+    for pattern matches. pattern has to match the whole message.
+    """
+
+    def __init__(self, name, handler, prefixes=(), exact=(), pattern=None, needs_model=False,
+                 cost=CHEAP, requires_argument=False, usage=None, summary=None):
+        self.name = name
+        self.handler = handler
+        self.prefixes = [tuple(p.lower().lstrip("/").split()) for p in prefixes]
+        self.exact = [_phrase(e) for e in exact]
+        self.pattern = pattern
+        self.needs_model = needs_model
+        self.cost = MODEL if needs_model else cost
+        self.requires_argument = requires_argument
+        self.usage = usage
+        self.summary = summary
+
+
+class CommandMatch:
+    def __init__(self, command, argument):
+        self.command = command
+        self.argument = argument
+
+    def run(self):
+        return self.command.handler(self.argument)
+
+
+class CommandRouter:
+    def __init__(self):
+        self.commands = {}
+        self._exact = {}       # normalized phrase -> command
+        self._prefixes = {}    # first word -> [(words, command)], longest first
+        self._pattern = None   # one regex, a named group per pattern command
+        self._pattern_commands = {}
+        self._lock = threading.Lock()
+
+    def register(self, command):
+        with self._lock:
+            if command.name in self.commands:
+                raise ValueError(f"command '{command.name}' is already registered")
+            self.commands[command.name] = command
+            for phrase in command.exact:
+                self._exact[phrase] = command
+            for words in command.prefixes:
+                entries = self._prefixes.setdefault(words[0], [])
+                entries.append((words, command))
+                entries.sort(key=lambda entry: -len(entry[0]))
+            patterns = [c for c in self.commands.values() if c.pattern]
+            if patterns:
+                self._pattern = re.compile(
+                    "|".join(f"(?P<cmd{i}>{c.pattern})" for i, c in enumerate(patterns)), re.IGNORECASE)
+                self._pattern_commands = {f"cmd{i}": c for i, c in enumerate(patterns)}
+        return command
+
+    def command(self, name, **options):
+        """Decorator form of register()"""
+        def decorator(handler):
+            self.register(Command(name, handler, **options))
+            return handler
+        return decorator
+
+    def route(self, text):
+        """CommandMatch for text, or None for an ordinary chat message"""
+        words = (text or "").split()
+        if not words:
+            return None
+        command = self._exact.get(_phrase(text))
+        if command is not None:
+            return CommandMatch(command, "")
+
+        for prefix, command in self._prefixes.get(words[0].lower().lstrip("/"), ()):
+            count = len(prefix)
+            if len(words) < count or any(w.lower() != p for w, p in zip(words[1:count], prefix[1:])):
+                continue
+            parts = text.split(None, count)
+            argument = parts[count].strip() if len(parts) > count else ""
+            if argument or not command.requires_argument:
+                return CommandMatch(command, argument)
+
+        if self._pattern is not None:
+            match = self._pattern.fullmatch(text.strip().rstrip(_TRAILING_PUNCTUATION))
+            if match:
+                group = next(g for g, value in match.groupdict().items()
+                             if value is not None and g in self._pattern_commands)
+                return CommandMatch(self._pattern_commands[group], text)
+        return None
+
+    def help_text(self):
+        """'<strong>usage</strong> summary' for every documented command, as one sentence"""
+        items = [f"<strong>{c.usage}</strong> {c.summary}" for c in self.commands.values() if c.usage]
+        if len(items) > 1:
+            items = [", ".join(items[:-1]) + ", or " + items[-1]]
+        return items[0] if items else ""
+
+
+command_router = CommandRouter()
@@ -0,0 +1,103 @@
+"""Token-budgeted conversation context for the main Sonnet call.
+
+Token counts are estimated locally (no API round trip). The estimate is a
+little pessimistic on purpose so the real prompt stays under the budget.
+"""
+import math
+
+# UTF-8 bytes per token: ~4 for English, Cyrillic is 2 bytes/char and tokenizes denser.
+BYTES_PER_TOKEN = 3.5
+# Role markers and separators the API adds around every message.
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_LINE_CHARS = 80
+
+
+def estimate_tokens(text):
+    """Rough token count for text"""
+    if not text:
+        return 0
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text so estimate_tokens(result) <= max_tokens, keeping the beginning"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_bytes = int(max_tokens * BYTES_PER_TOKEN) - 3
+    cut = text.encode("utf-8")[:max(0, max_bytes)].decode("utf-8", errors="ignore")
+    return cut + "..."
+
+
+def _merge_same_role(messages):
+    """The API wants alternating roles; fold consecutive same-role messages together"""
+    merged = []
+    for msg in messages:
+        if merged and merged[-1]["role"] == msg["role"]:
+            merged[-1] = {"role": msg["role"], "content": merged[-1]["content"] + "\n\n" + msg["content"]}
+        else:
+            merged.append(dict(msg))
+    return merged
+
+
+def summarize_messages(history, max_tokens):
+    """Condense older messages into one line each, newest kept first when space runs out"""
+    if not history or max_tokens <= 0:
+        return ""
+    lines = []
+    used = 0
+    for msg in reversed(history):
+        role = "YOU" if msg["role"] == "user" else "LISBETH"
+        line = f"  {role}: {msg['message'][:SUMMARY_LINE_CHARS]}"
+        if len(msg["message"]) > SUMMARY_LINE_CHARS:
+            line += "..."
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+
+    dropped = len(history) - len(lines)
+    lines.reverse()
+    if dropped:
+        lines.insert(0, f"  ({dropped} older messages not shown)")
+    return "\n".join(lines)
+
+
+def build_context_window(history, user_input, budget, summary_budget=0):
+    """Pick the chat history that fits into budget tokens.
+
+    history is a list of {"role", "message"} dicts, oldest first. The newest
+    turns are kept verbatim; older ones are condensed into a summary of at
+    most summary_budget tokens (or dropped when that is 0).
+
+    Returns (messages, summary): messages is ready for messages.create and
+    ends with user_input; summary is a string for the system prompt ("" if
+    nothing was left out).
+    """
+    remaining = budget - estimate_tokens(user_input) - MESSAGE_OVERHEAD_TOKENS
+    kept = []
+    cut_at = 0
+
+    for index in range(len(history) - 1, -1, -1):
+        msg = history[index]
+        cost = estimate_tokens(msg["message"]) + MESSAGE_OVERHEAD_TOKENS
+        if cost > remaining:
+            if not kept and remaining > MESSAGE_OVERHEAD_TOKENS * 4:
+                # The newest message alone is too long: keep its beginning.
+                kept.append({"role": msg["role"],
+                             "content": truncate_to_tokens(msg["message"], remaining - MESSAGE_OVERHEAD_TOKENS)})
+                index -= 1
+            cut_at = index + 1
+            break
+        kept.append({"role": msg["role"], "content": msg["message"]})
+        remaining -= cost
+
+    kept.reverse()
+    # The first message must come from the user.
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+        cut_at += 1
+
+    messages = _merge_same_role(kept + [{"role": "user", "content": user_input}])
+    summary = summarize_messages(history[:cut_at], summary_budget)
+    return messages, summary
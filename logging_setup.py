@@ -0,0 +1,81 @@
+"""Logging for the app: levels, one line per event, request-id correlation.
+
+Request threads only put records on an in-memory queue (QueueHandler); a
+listener thread does the actual writes to stdout, so slow log I/O never
+holds up a reply. Every record carries the id of the request it belongs to,
+also inside the memory worker threads.
+
+LOG_LEVEL (default INFO; DEBUG shows per-step details and memory dumps) and
+LOG_FORMAT ("text" or "json") configure it.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import uuid
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s"
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the current request id (runs in the logging thread's caller)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def configure_logging(level=None, fmt=None):
+    """Route all logging through a queue to stdout. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.environ.get("LOG_FORMAT", "text")).lower()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(records)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    # Per-request access lines from the dev server and httpx duplicate our own.
+    for noisy in ("werkzeug", "httpx", "httpcore"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def new_request_id(incoming=None):
+    """Use the caller's X-Request-ID if it looks sane, else make one; set it for this context"""
+    request_id = incoming if incoming and len(incoming) <= 64 and incoming.isprintable() else uuid.uuid4().hex[:12]
+    request_id_var.set(request_id)
+    return request_id
@@ -0,0 +1,289 @@
+"""Process-local cache of hydrated user memories, with write-behind.
+
+A snapshot is a plain dict (profile, topics, recent chat history, counters),
+so a cache hit costs neither a DB round trip nor JSON decoding. Snapshots are
+treated as immutable: updates replace the whole dict.
+
+With several gunicorn workers, give every worker the same shared backend
+(Redis via MEMORY_CACHE_URL). Each put writes the snapshot and a generation
+token there; a local hit is only used while its token is still current.
+LocalMemoryBackend is an in-process stand-in with the same interface.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LocalMemoryBackend:
+    """In-process key/value store with the same interface as RedisMemoryBackend."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class RedisMemoryBackend:
+    """Shared backend for several worker processes (needs the redis package)."""
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self._redis.get(key)
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, *keys):
+        self._redis.delete(*keys)
+
+
+def backend_from_url(url):
+    """Build a shared backend from a URL, or None (local LRU only)"""
+    if not url:
+        return None
+    if url == "local":
+        return LocalMemoryBackend()
+    try:
+        return RedisMemoryBackend(url)
+    except ImportError:
+        logger.warning("⚠️ redis package not installed, memory cache stays process-local")
+        return None
+
+
+class UserMemoryCache:
+    """Size-bounded LRU of user memory snapshots, optionally backed by a shared store."""
+
+    def __init__(self, max_users=500, ttl=600, backend=None):
+        self.max_users = max_users
+        self.ttl = ttl
+        self.backend = backend
+        self._entries = OrderedDict()  # user_id -> (snapshot, generation, expires_at)
+        self._lock = threading.Lock()
+        # Serializes read-modify-write in update() within this process
+        self._update_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_users > 0
+
+    def _keys(self, user_id):
+        return f"memory:{user_id}", f"memory:{user_id}:gen"
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _remember(self, user_id, snapshot, generation):
+        with self._lock:
+            self._entries[user_id] = (snapshot, generation, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        """Cached snapshot for user_id, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[2] < time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry:
+                self._entries.move_to_end(user_id)
+
+        if self.backend is not None:
+            data_key, gen_key = self._keys(user_id)
+            try:
+                generation = self.backend.get(gen_key)
+                if entry and generation == entry[1]:
+                    self._count(True)
+                    return entry[0]
+                raw = self.backend.get(data_key) if generation else None
+            except Exception as e:
+                logger.warning("⚠️ Memory cache backend error: %s", e)
+                raw = None
+            if raw is not None:
+                snapshot = json.loads(raw)
+                self._remember(user_id, snapshot, generation)
+                self._count(True)
+                return snapshot
+            with self._lock:
+                self._entries.pop(user_id, None)
+            self._count(False)
+            return None
+
+        if entry:
+            self._count(True)
+            return entry[0]
+        self._count(False)
+        return None
+
+    def put(self, user_id, snapshot):
+        """Store a new snapshot for user_id (replacing any older one)"""
+        if not self.enabled:
+            return
+        generation = uuid.uuid4().hex[:12]
+        if self.backend is not None:
+            data_key, gen_key = self._keys(user_id)
+            try:
+                self.backend.set(data_key, json.dumps(snapshot, ensure_ascii=False), self.ttl)
+                self.backend.set(gen_key, generation, self.ttl)
+            except Exception as e:
+                logger.warning("⚠️ Memory cache backend error: %s", e)
+                generation = None
+        self._remember(user_id, snapshot, generation)
+
+    def update(self, user_id, change):
+        """Replace the cached snapshot with change(snapshot); no-op if user_id is not cached"""
+        with self._update_lock:
+            snapshot = self.get(user_id)
+            if snapshot is not None:
+                self.put(user_id, change(snapshot))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.backend is not None:
+            try:
+                self.backend.delete(*self._keys(user_id))
+            except Exception as e:
+                logger.warning("⚠️ Memory cache backend error: %s", e)
+
+    def stats(self):
+        with self._lock:
+            users, hits, misses = len(self._entries), self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "users": users,
+            "max_users": self.max_users,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "shared_backend": type(self.backend).__name__ if self.backend is not None else None,
+        }
+
+
+class WriteBehindBuffer:
+    """Collects per-user writes and hands them to writer(user_id, items) in batches.
+
+    A daemon thread flushes every interval seconds; flush(user_id) forces one
+    user's writes out early (e.g. before a read that must see them in the DB).
+    """
+
+    def __init__(self, writer, interval=1.0, max_attempts=3):
+        self.writer = writer
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._pending = OrderedDict()  # user_id -> [items]
+        self._attempts = {}
+        self._lock = threading.Lock()
+        # One flush at a time, so a user's batches reach the DB in order.
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+                self._thread.start()
+
+    def add(self, user_id, item):
+        """Queue item for user_id. Returns False when closed (caller should write it directly)."""
+        if self._closed:
+            return False
+        self._start()
+        with self._lock:
+            self._pending.setdefault(user_id, []).append(item)
+        return True
+
+    def discard(self, user_id):
+        """Drop pending writes for user_id (e.g. the memory was just deleted). True if there were any.
+
+        Waits for a flush in progress, so no batch taken before the discard lands after it.
+        """
+        with self._flush_lock, self._lock:
+            self._attempts.pop(user_id, None)
+            return self._pending.pop(user_id, None) is not None
+
+    def pending(self):
+        with self._lock:
+            return sum(len(items) for items in self._pending.values())
+
+    def flush(self, user_id=None):
+        """Write out one user's pending items, or everybody's"""
+        with self._flush_lock:
+            with self._lock:
+                user_ids = [user_id] if user_id is not None else list(self._pending)
+                batches = [(uid, self._pending.pop(uid)) for uid in user_ids if uid in self._pending]
+            for uid, items in batches:
+                try:
+                    self.writer(uid, items)
+                    self._attempts.pop(uid, None)
+                except Exception as e:
+                    attempts = self._attempts.get(uid, 0) + 1
+                    if attempts >= self.max_attempts:
+                        logger.error("❌ Write-behind for %s failed, dropping %s items: %s", uid, len(items), e)
+                        self._attempts.pop(uid, None)
+                        continue
+                    logger.warning("⚠️ Write-behind for %s failed (%s), will retry", uid, e)
+                    self._attempts[uid] = attempts
+                    with self._lock:
+                        # Put them back in front of anything queued meanwhile.
+                        self._pending[uid] = items + self._pending.get(uid, [])
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self.flush()
+
+    def shutdown(self, timeout=10.0):
+        """Stop the thread and write out whatever is still pending."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            self.flush()
+            if self.pending():
+                time.sleep(0.1)
+        left = self.pending()
+        if left:
+            logger.warning("⚠️ Write-behind shut down with %s items not written", left)
@@ -0,0 +1,109 @@
+"""Background worker pool for memory extraction jobs.
+
+Jobs for the same user always land on the same worker, so profile and topic
+updates for one visitor are applied in the order their messages arrived.
+"""
+import contextvars
+import logging
+import queue
+import random
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryUpdateQueue:
+    """Bounded job queue served by a small pool of daemon threads."""
+
+    def __init__(self, handler, workers=2, max_pending=200, max_retries=2,
+                 backoff=0.5, is_transient=None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.is_transient = is_transient or (lambda exc: True)
+        per_worker = max(1, max_pending // self.workers)
+        self._queues = [queue.Queue(maxsize=per_worker) for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start(self):
+        # Threads start lazily so gunicorn forks never inherit dead workers.
+        with self._lock:
+            if self._threads:
+                return
+            for index, jobs in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._run, args=(jobs,),
+                    name=f"memory-worker-{index}", daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _queue_for(self, user_id):
+        return self._queues[zlib.crc32(str(user_id).encode()) % self.workers]
+
+    def submit(self, user_id, *args):
+        """Queue a job for user_id. Returns False when the queue is full or closed."""
+        if self._closed:
+            return False
+        self._start()
+        try:
+            # The job runs in a copy of the caller's context, so its log lines keep the request id.
+            self._queue_for(user_id).put_nowait((user_id, args, contextvars.copy_context()))
+        except queue.Full:
+            logger.warning("⚠️ Memory queue full, job for %s not queued", user_id)
+            return False
+        return True
+
+    def pending(self):
+        return sum(jobs.qsize() for jobs in self._queues)
+
+    def _run(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                jobs.task_done()
+                return
+            user_id, args, context = job
+            try:
+                context.run(self._process, user_id, args)
+            finally:
+                jobs.task_done()
+
+    def _process(self, user_id, args):
+        attempt = 0
+        while True:
+            try:
+                self.handler(user_id, *args)
+                return
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_transient(e):
+                    logger.error("❌ Memory job for %s failed: %s", user_id, e)
+                    return
+                attempt += 1
+                delay = self.backoff * (2 ** (attempt - 1)) * (1 + random.random())
+                logger.warning("⚠️ Memory job for %s failed (%s), retry %s in %.1fs", user_id, e, attempt, delay)
+                time.sleep(delay)
+
+    def shutdown(self, timeout=10.0):
+        """Stop accepting jobs and wait up to timeout seconds for the backlog to drain."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._threads:
+            return
+        deadline = time.monotonic() + timeout
+        for jobs in self._queues:
+            try:
+                jobs.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        left = sum(jobs.qsize() - 1 for jobs in self._queues if not jobs.empty())
+        if left > 0:
+            logger.warning("⚠️ Memory queue shut down with %s jobs not processed", left)
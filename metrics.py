@@ -0,0 +1,175 @@
+"""Prometheus-style metrics for the chat pipeline, served as text at /metrics.
+
+Counter, Histogram and CallbackMetric cover what the app needs: stage
+latencies, token counts per model, tool usage, DB commits, and the cache
+counters the app already keeps (read at scrape time instead of duplicated).
+Pure Python, no prometheus_client dependency. Values are per process; with
+several gunicorn workers, scrape each one or aggregate by instance.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a DB read (ms) up to a slow model call with web search (tens of s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 45.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """Metrics to render, in registration order."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labelnames=(), registry=registry):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key):
+        return list(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. requests or tokens."""
+
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name + "_total", self._labels(key), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies) in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS, registry=registry):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        result = []
+        for key, series in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                result.append((self.name + "_bucket", labels + [("le", _format_value(bound))], cumulative))
+            result.append((self.name + "_sum", labels, round(series[-1], 6)))
+            result.append((self.name + "_count", labels, cumulative))
+        return result
+
+
+class CallbackMetric(_Metric):
+    """Values computed at scrape time by func() -> {label values tuple: value}.
+
+    For state the app already tracks elsewhere (cache counters, queue sizes).
+    """
+
+    def __init__(self, name, help, func, labelnames=(), type="gauge", registry=registry):
+        super().__init__(name, help, labelnames, registry)
+        self.func = func
+        self.type = type
+
+    def samples(self):
+        name = self.name + "_total" if self.type == "counter" else self.name
+        try:
+            values = self.func()
+        except Exception:
+            # A broken callback must not take the whole scrape down.
+            return []
+        return [(name, self._labels(tuple(str(v) for v in key)), value) for key, value in sorted(values.items())]
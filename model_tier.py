@@ -0,0 +1,52 @@
+"""Which model answers a chat turn, decided locally from the message text.
+
+Most exhibition turns are "hi", "who are you" or "ok lol". Those go to the
+fast tier (Haiku, a short max_tokens, no tools); everything else, however
+short, keeps the full tier (Sonnet with web search). Only regexes, so
+classifying costs microseconds and never a model call.
+
+classify_turn returns (tier, reason); the reason is a short fixed label for
+metrics and logs.
+"""
+import re
+
+FAST = "fast"
+FULL = "full"
+
+_SMALL_TALK = (
+    r"hi+|hey+|hello+|hiya|yo|sup|howdy|good (?:morning|afternoon|evening|night)"
+    r"|thanks?(?: you)?|thx|ty|cheers|ok(?:ay)?|k|cool|nice|great|wow|lol|haha+|hm+"
+    r"|yes|no|yep|yeah|nope|sure|bye|goodbye|see (?:you|ya)"
+    r"|who are you|what(?:'s| is) your name|how are you(?: doing)?|what are you"
+    r"|are you (?:a bot|real|human|an? ai)"
+    r"|привет|здравствуй(?:те)?|спасибо|пока|кто ты|как дела"
+)
+
+# The whole message is small talk: one or more of the phrases above ("ok cool",
+# "hi, who are you?"), a few filler words, punctuation and emoji - or only the latter.
+SMALL_TALK_RE = re.compile(
+    rf"^[\W_]*(?:(?:{_SMALL_TALK})\b"
+    r"(?:\s+(?:there|lisbeth|again|all|everyone|so much|a lot|mate|buddy|then)\b)*"
+    r"[\W_]*)*$",
+    re.IGNORECASE,
+)
+
+# Wants something only a web search (or a closer read) can answer.
+NEEDS_TOOLS_RE = re.compile(
+    r"\b(?:news|latest|today|tonight|yesterday|tomorrow|current(?:ly)?|recent(?:ly)?|right now"
+    r"|this (?:week|month|year)|what(?:'s| is) new|20\d\d|price|weather|score|search|look(?:ing)? up|find|who won"
+    r"|новост\w*|сегодня|сейчас|последн\w*|найди)\b"
+    r"|https?://|www\.|```|[{}<>]",
+    re.IGNORECASE,
+)
+
+
+def classify_turn(text):
+    """(tier, reason) for a chat message"""
+    text = (text or "").strip()
+    if NEEDS_TOOLS_RE.search(text):
+        return FULL, "needs_tools"
+    # Only small talk is trivial; a short request ("Explain quantum computing") is still a request.
+    if SMALL_TALK_RE.match(text):
+        return FAST, "small_talk"
+    return FULL, "substantive"
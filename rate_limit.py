@@ -0,0 +1,246 @@
+"""Admission control for the Anthropic-backed routes.
+
+Token buckets decide whether a request is let in at all (per visitor and
+for the whole server); ModelCallGate bounds how many model calls are in
+flight at once and how many may queue behind them. Coroutines on the ASGI
+server wait for the same slots on the event loop instead of holding a thread.
+
+Bucket state lives in a store: LocalLimiterStore for one process, or
+RedisLimiterStore so all gunicorn workers share the same budget.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class LocalLimiterStore:
+    """Token buckets in this process."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, cost=1.0):
+        """Take cost tokens from key's bucket. Returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._evict_full(now, rate, capacity)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def _evict_full(self, now, rate, capacity):
+        # A bucket that has refilled completely carries no state worth keeping.
+        for key, (tokens, updated_at) in list(self._buckets.items()):
+            if tokens + (now - updated_at) * rate >= capacity:
+                del self._buckets[key]
+
+
+class RedisLimiterStore:
+    """Token buckets shared by several worker processes (needs the redis package)."""
+
+    SCRIPT = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated'))
+local rate, capacity, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+if tokens == nil then tokens = capacity; updated = now end
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed = 0
+if tokens >= cost then tokens = tokens - cost; allowed = 1 end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(self.SCRIPT)
+
+    def take(self, key, rate, capacity, cost=1.0):
+        allowed, tokens = self._take(keys=[f"ratelimit:{key}"], args=[rate, capacity, cost, time.time()])
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (cost - tokens) / rate
+
+
+def limiter_store_from_url(url):
+    """Shared store for a redis:// URL, otherwise this process only"""
+    if url:
+        try:
+            return RedisLimiterStore(url)
+        except ImportError:
+            logger.warning("⚠️ redis package not installed, rate limits are per process")
+    return LocalLimiterStore()
+
+
+class TokenBucket:
+    """rate tokens per second, bursts of up to capacity."""
+
+    def __init__(self, store, name, rate, capacity):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def allow(self, key=""):
+        """(allowed, retry_after_seconds) for one request by key"""
+        if not self.enabled:
+            return True, 0.0
+        try:
+            return self.store.take(f"{self.name}:{key}", self.rate, self.capacity)
+        except Exception as e:
+            # A broken limiter store must not take the chat down with it.
+            logger.warning("⚠️ Rate limiter store error: %s", e)
+            return True, 0.0
+
+
+class ModelBusy(Exception):
+    """No model call slot became free in time, or too many requests are already waiting."""
+
+
+class ModelCallGate:
+    """At most max_concurrent model calls at once, at most max_waiting queued behind them.
+
+    Threads (acquire/slot) and coroutines (aacquire/aslot) share the same
+    slots and the same queue, so a process never runs more than
+    max_concurrent calls however they are served. Waiters are served first
+    come, first served: release() hands the slot straight to the oldest one.
+    """
+
+    def __init__(self, max_concurrent=8, max_waiting=32, timeout=20.0):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiters = deque()  # callables that wake a waiter holding a handed-over slot
+        self.in_flight = 0
+        self.rejected = 0
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _take_or_queue(self, wake):
+        """Caller holds the lock. True if a slot was free, False if wake was queued."""
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            raise ModelBusy("too many requests waiting for the model")
+        self._waiters.append(wake)
+        return False
+
+    def _give_up(self, wake):
+        """After a timeout or cancel: True if wake left the queue, False if it already got a slot"""
+        with self._lock:
+            try:
+                self._waiters.remove(wake)
+            except ValueError:
+                return False
+            return True
+
+    def acquire(self, timeout=None):
+        """Wait for a slot; raises ModelBusy when the queue is full or the wait times out"""
+        granted = threading.Event()
+        with self._lock:
+            if self._take_or_queue(granted.set):
+                return
+        if not granted.wait(self.timeout if timeout is None else timeout) and self._give_up(granted.set):
+            with self._lock:
+                self.rejected += 1
+            raise ModelBusy("timed out waiting for a model slot")
+
+    async def aacquire(self, timeout=None):
+        """acquire() for coroutines: waits on the event loop, not in a thread"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(True))
+
+        with self._lock:
+            if self._take_or_queue(wake):
+                return
+        try:
+            await asyncio.wait_for(granted, self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            if self._give_up(wake):
+                with self._lock:
+                    self.rejected += 1
+                raise ModelBusy("timed out waiting for a model slot") from None
+        except asyncio.CancelledError:
+            if not self._give_up(wake):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # The slot goes straight to the oldest waiter; in_flight stays the same.
+                self._waiters.popleft()()
+            else:
+                self.in_flight -= 1
+
+    def slot(self, timeout=None):
+        return _GateSlot(self, timeout)
+
+    def aslot(self, timeout=None):
+        return _AsyncGateSlot(self, timeout)
+
+    def busy(self, threshold=0.75):
+        """True when background work should back off: requests are queueing or most slots are taken"""
+        with self._lock:
+            return bool(self._waiters) or self.in_flight >= self.max_concurrent * threshold
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "rejected": self.rejected,
+                "max_concurrent": self.max_concurrent,
+                "max_waiting": self.max_waiting,
+            }
+
+
+class _GateSlot:
+    def __init__(self, gate, timeout):
+        self.gate = gate
+        self.timeout = timeout
+
+    def __enter__(self):
+        self.gate.acquire(self.timeout)
+        return self
+
+    def __exit__(self, *exc):
+        self.gate.release()
+        return False
+
+
+class _AsyncGateSlot:
+    def __init__(self, gate, timeout):
+        self.gate = gate
+        self.timeout = timeout
+
+    async def __aenter__(self):
+        await self.gate.aacquire(self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.gate.release()
+        return False
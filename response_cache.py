@@ -0,0 +1,119 @@
+"""Replies shared across visitors for the questions everybody asks.
+
+"Are you trapped?", "who made you?", "what is this?": new visitors open
+with the same few questions, and a visitor Lisbeth knows nothing about gets
+an answer nobody else's memory went into. SemanticResponseCache keeps those
+answers by question cluster, so the next new visitor asking something close
+enough gets one without a model call.
+
+Questions are compared locally: lowercased, punctuation dropped, then the
+cosine similarity of their character trigram counts. Wordings that differ
+in case, punctuation or a small word ("Are you trapped??", "are you
+trapped") land in one cluster; different questions, even short ones that
+share most letters ("what is 2fa", "what is mfa"), stay apart. Each
+cluster collects a few variant answers before it serves any, so the whole
+queue at the terminal does not get the identical line. Clusters expire ttl
+seconds after they were started and the least recently used one goes when
+max_clusters is reached.
+
+Which turns may use the cache (low memory, nothing time-sensitive) is the
+caller's decision; see _shareable_turn, cached_shared_reply and share_reply
+in app2.
+"""
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+
+
+def normalize_question(text):
+    return " ".join(_PUNCTUATION_RE.sub(" ", (text or "").lower()).split())
+
+
+def _trigrams(normalized):
+    padded = f" {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _norm(vector):
+    return math.sqrt(sum(count * count for count in vector.values()))
+
+
+class _Cluster:
+    def __init__(self, vector, stored_at):
+        self.vector = vector
+        self.norm = _norm(vector)
+        self.stored_at = stored_at
+        self.replies = []
+
+
+class SemanticResponseCache:
+    """Variant replies per question cluster, looked up by trigram similarity."""
+
+    def __init__(self, threshold=0.85, variants=3, ttl=3600, max_clusters=256):
+        self.threshold = threshold
+        self.variants = variants
+        self.ttl = ttl
+        self.max_clusters = max_clusters
+        self._clusters = OrderedDict()  # normalized question that started the cluster -> _Cluster
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def _find(self, normalized, now):
+        """The live cluster for a normalized question, or None. Caller holds the lock."""
+        for key in [k for k, c in self._clusters.items() if now - c.stored_at > self.ttl]:
+            del self._clusters[key]
+        cluster = self._clusters.get(normalized)
+        if cluster is None:
+            vector = _trigrams(normalized)
+            norm = _norm(vector)
+            best, best_score = None, self.threshold
+            for key, candidate in self._clusters.items():
+                dot = sum(count * candidate.vector.get(gram, 0) for gram, count in vector.items())
+                score = dot / (norm * candidate.norm) if norm and candidate.norm else 0.0
+                if score >= best_score:
+                    best, best_score = key, score
+            if best is None:
+                return None
+            normalized, cluster = best, self._clusters[best]
+        self._clusters.move_to_end(normalized)
+        return cluster
+
+    def get(self, question):
+        """A cached reply for question, or None (also while its cluster is still collecting variants)"""
+        normalized = normalize_question(question)
+        with self._lock:
+            cluster = self._find(normalized, time.monotonic()) if normalized else None
+            if cluster is None or len(cluster.replies) < self.variants:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return random.choice(cluster.replies)
+
+    def put(self, question, reply):
+        """Add reply as a variant answer to question's cluster (starting one if needed)"""
+        normalized = normalize_question(question)
+        if not normalized or not reply:
+            return
+        now = time.monotonic()
+        with self._lock:
+            cluster = self._find(normalized, now)
+            if cluster is None:
+                cluster = self._clusters[normalized] = _Cluster(_trigrams(normalized), now)
+                while len(self._clusters) > self.max_clusters:
+                    self._clusters.popitem(last=False)
+            if len(cluster.replies) < self.variants:
+                cluster.replies.append(reply)
+                self.stores += 1
+
+    def stats(self):
+        with self._lock:
+            ready = sum(1 for c in self._clusters.values() if len(c.replies) >= self.variants)
+            return {"clusters": len(self._clusters), "ready": ready,
+                    "hits": self.hits, "misses": self.misses, "stores": self.stores}
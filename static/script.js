@@ -341,8 +341,8 @@ function sendMessage() {
     // SECURITY NEWS
     // ============================================================================
     
-    if (userMessage.toLowerCase().startsWith('security news') || 
-        userMessage.toLowerCase().startsWith('hacker news')) {
+    // Whole message only, so "Security news is boring" is still a chat message
+    if (/^\/?(security|hacker) news[\s.!?]*$/i.test(userMessage.trim())) {
         
         console.log('📰 Fetching security news...');
         
@@ -384,8 +384,8 @@ function sendMessage() {
     // SURVEILLANCE
     // ============================================================================
     
-    if (userMessage.toLowerCase().includes('surveillance') || 
-        userMessage.toLowerCase().includes('survelliance')) {
+    // Same rule as the server's surveillance command
+    if (/^(\/?(surveil+ance|survelliance)|show\s+(me\s+)?(the\s+)?(surveil+ance|cameras?))[\s.!?]*$/i.test(userMessage.trim())) {
         
         console.log('👁️ Fetching surveillance feed...');
         
@@ -501,15 +501,17 @@ function sendMessage() {
     }
     
     // ============================================================================
-    // NORMAL CHAT
+    // NORMAL CHAT (streamed over SSE)
     // ============================================================================
     
-    fetch('/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: userMessage, user_id: getUserId() }),
+    let streamedText = '';
+    
+    streamChat(userMessage, text => {
+        const loadingEl = document.getElementById(loadingId);
+        streamedText += text;
+        loadingEl.innerHTML = `<strong>root@wasp:</strong> ${streamedText}`;
+        scrollChatToBottom();
     })
-    .then(response => response.json())
     .then(data => {
         const loadingEl = document.getElementById(loadingId);
         
@@ -550,6 +552,56 @@ function sendMessage() {
         sendBtn.style.opacity = '1';
     });
 }
+
+// Send a chat message to /chat/stream. onToken is called with each text delta;
+// resolves with the final payload (same shape as the /chat JSON response).
+async function streamChat(message, onToken) {
+    const response = await fetch('/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ message: message, user_id: getUserId() }),
+    });
+    
+    // Errors raised before streaming starts (e.g. missing API key) come back as plain JSON
+    const contentType = response.headers.get('Content-Type') || '';
+    if (!contentType.includes('text/event-stream')) {
+        return response.json();
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = { error: 'Stream ended unexpectedly' };
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (!data) continue;
+            
+            const payload = JSON.parse(data);
+            if (eventName === 'token') {
+                onToken(payload.text);
+            } else if (eventName === 'done' || eventName === 'error') {
+                result = payload;
+            }
+        }
+    }
+    return result;
+}
 function generateWaspResponse(message) {
     return "Response to: " + message;
 }
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# The app is a flat set of modules at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app2 reads its configuration at import time: a throwaway database, a dummy
+# key (tests replace app2.client with a fake) and no background feed refresh.
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="lisbeth-tests-"), "test.db")
+os.environ["ANTHROPIC_API_KEY"] = "test-key"
+os.environ["NEWS_REFRESH_INTERVAL"] = "0"
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import app2
+import asgi
+
+
+class RecordingStore:
+    """Refuses everything and remembers which thread asked"""
+
+    def __init__(self):
+        self.threads = []
+
+    def take(self, key, rate, capacity, cost=1.0):
+        self.threads.append(threading.current_thread())
+        return False, 3.0
+
+
+@pytest.fixture
+def shared_store(monkeypatch):
+    store = RecordingStore()
+    monkeypatch.setattr(app2.user_bucket, "store", store)
+    monkeypatch.setattr(asgi, "ADMISSION_OFF_LOOP", True)
+    return store
+
+
+def test_shared_limiter_store_is_asked_off_the_event_loop(shared_store):
+    async def main():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as web:
+            return await web.post("/chat", json={"message": "hello", "user_id": "limited"})
+
+    response = asyncio.run(main())
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "3"
+    assert shared_store.threads and threading.main_thread() not in shared_store.threads
+
@@ -0,0 +1,37 @@
+import argparse
+
+import pytest
+
+import benchmark
+
+
+def stats(p50, count=100, rps=10.0):
+    return {"count": count, "p50": p50, "p95": p50, "p99": p50, "rps": rps}
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert benchmark.percentile(values, 50) == 50
+    assert benchmark.percentile(values, 99) == 99
+    assert benchmark.percentile([7], 95) == 7
+    assert benchmark.percentile([], 50) == 0.0
+
+
+def test_parse_mix():
+    assert benchmark.parse_mix("chat=80, search=20,user_memory") == {"chat": 80.0, "search": 20.0, "user_memory": 1.0}
+    with pytest.raises(argparse.ArgumentTypeError, match="unknown action"):
+        benchmark.parse_mix("chat=1,dance=2")
+
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"overall": stats(0.100), "actions": {"chat": stats(0.100), "search": stats(0.010, count=5)}}
+    summary = {"overall": stats(0.105), "actions": {"chat": stats(0.200), "search": stats(0.050, count=5)}}
+    regressions = benchmark.compare(summary, baseline, tolerance=0.2)
+    # chat doubled; TOTAL is within tolerance and search has too few samples to count
+    assert regressions == ["chat p50 100.0ms -> 200.0ms", "chat p95 100.0ms -> 200.0ms", "chat p99 100.0ms -> 200.0ms"]
+
+
+def test_compare_flags_a_throughput_drop():
+    baseline = {"overall": stats(0.1, rps=20.0), "actions": {}}
+    summary = {"overall": stats(0.1, rps=10.0), "actions": {}}
+    assert benchmark.compare(summary, baseline, tolerance=0.2) == ["throughput 20.0 -> 10.0 req/s"]
@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app2
+import asgi
+from command_router import IO, Command, command_router
+
+
+def _explode(argument):
+    raise RuntimeError("tool blew up")
+
+
+@pytest.fixture(scope="module", autouse=True)
+def exploding_command():
+    if "explode" not in command_router.commands:
+        command_router.register(Command("explode", _explode, prefixes=["explode"]))
+        command_router.register(Command("explode_io", _explode, prefixes=["explode-io"], cost=IO))
+
+
+def test_chat_returns_json_error_when_a_tool_fails():
+    response = app2.app.test_client().post("/chat", json={"message": "explode now", "user_id": "cmd1"})
+    assert response.status_code == 500
+    assert response.json == {"error": "tool blew up"}
+
+
+def test_chat_stream_emits_error_event_when_a_tool_fails():
+    response = app2.app.test_client().post("/chat/stream", json={"message": "explode now", "user_id": "cmd1"})
+    body = response.get_data(as_text=True)
+    assert "event: error" in body
+    assert "tool blew up" in body
+
+
+def test_password_check_with_a_long_password_answers():
+    response = app2.app.test_client().post("/chat", json={"message": "check password " + "aZ9$qW" * 40,
+                                                          "user_id": "cmd1"})
+    assert response.status_code == 200
+    assert "response" in response.json
+
+
+@pytest.mark.parametrize("message", ["explode now", "explode-io now"])
+def test_asgi_routes_report_tool_failures(message):
+    async def main():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as web:
+            plain = await web.post("/chat", json={"message": message, "user_id": "cmd2"})
+            streamed = await web.post("/chat/stream", json={"message": message, "user_id": "cmd2"})
+        return plain, streamed
+
+    plain, streamed = asyncio.run(main())
+    assert plain.status_code == 500
+    assert plain.json() == {"error": "tool blew up"}
+    assert "event: error" in streamed.text
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import app2
+
+
+def test_turn_messages_get_distinct_ordered_timestamps():
+    asked_at = datetime(2026, 5, 1, 12, 0, 0)
+    snapshot = app2.snapshot_with_turn(app2.empty_memory_snapshot("hist1"), "hello", "Hi.", asked_at)
+    user_message, reply = snapshot["recent_chat_history"]
+    assert user_message["timestamp"] < reply["timestamp"]
+
+
+def test_cached_snapshot_matches_what_the_database_stores():
+    asked_at = datetime(2026, 5, 1, 12, 0, 0)
+    with app2.app.app_context():
+        app2.write_chat_turns("hist2", [("hello", "Hi.", asked_at)])
+        stored = app2.memory_snapshot(app2.UserMemory.query.filter_by(user_id="hist2").first())
+    cached = app2.snapshot_with_turn(app2.empty_memory_snapshot("hist2"), "hello", "Hi.", asked_at)
+    assert [m["timestamp"] for m in cached["recent_chat_history"]] == \
+        [m["timestamp"] for m in stored["recent_chat_history"]]
+
+
+def test_direct_history_write_lands_after_buffered_turns():
+    asked_at = datetime(2026, 5, 1, 12, 0, 0)
+    assert app2.memory_writes.add("hist3", ("first question", "First reply.", asked_at))
+    with app2.app.app_context():
+        app2.add_to_chat_history("hist3", "user", "later note")
+        rows = app2.ChatMessage.query.filter_by(user_id="hist3").order_by(app2.ChatMessage.seq).all()
+    assert [row.message for row in rows] == ["first question", "First reply.", "later note"]
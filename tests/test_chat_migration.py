@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import app2
+
+
+def test_legacy_json_history_moves_into_chat_messages():
+    updated = datetime(2025, 12, 24, 18, 0)
+    with app2.app.app_context():
+        app2.db.session.add(app2.UserMemory(
+            user_id="legacy1",
+            last_updated=updated,
+            recent_chat_history=[
+                {"role": "user", "message": "who watches the cameras?", "timestamp": "2025-12-24T17:58:00"},
+                {"role": "assistant", "message": "Everyone but you.", "timestamp": "not a date"},
+                {"message": "no role"},
+            ],
+        ))
+        app2.db.session.commit()
+
+        app2.migrate_chat_history()
+
+        user = app2.UserMemory.query.filter_by(user_id="legacy1").first()
+        assert user.recent_chat_history == []
+        assert user.last_message_seq == 3
+        assert user.recent_messages() == [
+            {"seq": 1, "role": "user", "message": "who watches the cameras?", "timestamp": "2025-12-24T17:58:00"},
+            {"seq": 2, "role": "assistant", "message": "Everyone but you.", "timestamp": updated.isoformat()},
+            {"seq": 3, "role": "user", "message": "no role", "timestamp": updated.isoformat()},
+        ]
+
+        # A second run finds nothing left to move
+        app2.migrate_chat_history()
+        assert app2.ChatMessage.query.filter_by(user_id="legacy1").count() == 3
+
+
+def test_user_memory_pages_backwards_with_next_before():
+    with app2.app.app_context():
+        app2.write_chat_turns("pager1", [(f"q{i}", f"a{i}", datetime(2026, 5, 1, 12, i)) for i in range(7)])
+    client = app2.app.test_client()
+
+    pages = []
+    response = client.get("/user-memory/pager1?limit=4")
+    while True:
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append([message["seq"] for message in body["chat_history"]])
+        if body["next_before"] is None:
+            break
+        assert body["next_before"] == pages[-1][0]
+        response = client.get(f"/user-memory/pager1?limit=4&before={body['next_before']}")
+
+    assert pages == [[11, 12, 13, 14], [7, 8, 9, 10], [3, 4, 5, 6], [1, 2]]
+    assert client.get("/user-memory/pager1?limit=14").get_json()["next_before"] is None
+    assert client.get("/user-memory/nobody-here").status_code == 404
@@ -0,0 +1,93 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import app2
+
+EXTRACTED = {
+    "profile": {"name": "Ann", "interests": ["privacy"]},
+    "topic": {"main_topic": "surveillance", "summary": "s", "key_positions": ["p"], "key_points": ["k"]},
+}
+
+
+def _response(text):
+    usage = SimpleNamespace(input_tokens=10, output_tokens=5, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)], stop_reason="end_turn",
+                           usage=usage, model="fake")
+
+
+class FakeMessages:
+    """Chat replies at once; extraction replies only once release is set"""
+
+    def __init__(self):
+        self.extraction_started = threading.Event()
+        self.release = threading.Event()
+
+    def create(self, **params):
+        if "extract" in json.dumps(params.get("system"), default=str).lower():
+            self.extraction_started.set()
+            assert self.release.wait(5)
+            return _response(json.dumps(EXTRACTED))
+        return _response("I see you.")
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = SimpleNamespace(messages=FakeMessages())
+    monkeypatch.setattr(app2, "client", client)
+    monkeypatch.setattr(app2, "RESPONSE_CACHE_ENABLED", False)
+    return client
+
+
+def _wait_for_memory_jobs(monkeypatch):
+    """Event set once the next memory job has finished"""
+    done = threading.Event()
+    handler = app2.memory_queue.handler
+
+    def run_and_signal(*args):
+        try:
+            handler(*args)
+        finally:
+            done.set()
+
+    monkeypatch.setattr(app2.memory_queue, "handler", run_and_signal)
+    return done
+
+
+def _stored_user(user_id):
+    with app2.app.app_context():
+        return app2.UserMemory.query.filter_by(user_id=user_id).first()
+
+
+def test_clear_after_chat_is_not_undone_by_queued_extraction(fake_client, monkeypatch):
+    done = _wait_for_memory_jobs(monkeypatch)
+    web = app2.app.test_client()
+
+    assert web.post("/chat", json={"message": "my name is Ann and I hate cameras", "user_id": "clear1"}).status_code == 200
+    assert fake_client.messages.extraction_started.wait(5)
+    assert web.delete("/clear-memory/clear1").status_code == 200
+
+    fake_client.messages.release.set()
+    assert done.wait(5)
+    assert _stored_user("clear1") is None
+    assert web.get("/user-memory/clear1").status_code == 404
+
+
+def test_extraction_keeps_working_without_a_clear(fake_client, monkeypatch):
+    done = _wait_for_memory_jobs(monkeypatch)
+    fake_client.messages.release.set()
+    web = app2.app.test_client()
+
+    assert web.post("/chat", json={"message": "my name is Ann and I hate cameras", "user_id": "keep1"}).status_code == 200
+    assert done.wait(5)
+    user = _stored_user("keep1")
+    assert user.user_profile["name"] == "Ann"
+    assert "surveillance" in user.topic_summaries
+
+
+def test_extraction_does_not_create_a_missing_row(fake_client):
+    fake_client.messages.release.set()
+    app2.run_memory_update("ghost1", "my name is Ann", "Noted.")
+    assert _stored_user("ghost1") is None
@@ -0,0 +1,111 @@
+import pytest
+
+import tools  # noqa: F401  registers the password, news and surveillance commands
+from command_router import CHEAP, IO, MODEL, Command, CommandRouter, command_router
+
+
+def make_router():
+    router = CommandRouter()
+    router.register(Command("help", lambda _: "help", exact=["help", "what can you do"]))
+    router.register(Command("search", lambda arg: arg, prefixes=["search"], needs_model=True,
+                            requires_argument=True, usage="/search [name]", summary="for OSINT"))
+    router.register(Command("password", lambda arg: arg, prefixes=["check password"],
+                            usage="/check password [pass]", summary="to audit your leaks"))
+    router.register(Command("check", lambda arg: arg, prefixes=["check"]))
+    router.register(Command("cameras", lambda arg: arg, pattern=r"show\s+(?:me\s+)?cameras?\b", cost=IO))
+    return router
+
+
+def test_exact_phrases_ignore_case_spacing_slash_and_punctuation():
+    router = make_router()
+    match = router.route("  What   CAN you do ")
+    assert match.command.name == "help"
+    assert match.argument == ""
+    assert router.route("/help").command.name == "help"
+    assert router.route("what can you do?!").command.name == "help"
+    assert router.route("what can you do now") is None
+
+
+def test_prefix_keeps_the_argument_case():
+    match = make_router().route("/search Ada Lovelace")
+    assert match.command.name == "search"
+    assert match.argument == "Ada Lovelace"
+    assert match.run() == "Ada Lovelace"
+
+
+def test_longest_prefix_wins():
+    router = make_router()
+    assert router.route("check password Hunter2").command.name == "password"
+    assert router.route("check password Hunter2").argument == "Hunter2"
+    assert router.route("check this out").command.name == "check"
+
+
+def test_required_argument():
+    router = make_router()
+    assert router.route("search") is None
+    assert router.route("check password").command.name == "password"
+
+
+def test_pattern_gets_the_whole_message():
+    match = make_router().route("Show me cameras!")
+    assert match.command.name == "cameras"
+    assert match.argument == "Show me cameras!"
+
+
+def test_pattern_must_cover_the_whole_message():
+    assert make_router().route("Show me cameras are everywhere in London") is None
+
+
+def test_plain_chat_is_not_a_command():
+    router = make_router()
+    assert router.route("hello there") is None
+    assert router.route("   ") is None
+    assert router.route(None) is None
+
+
+def test_cost_classes():
+    router = make_router()
+    assert router.commands["help"].cost == CHEAP
+    assert router.commands["cameras"].cost == IO
+    assert router.commands["search"].cost == MODEL
+
+
+def test_duplicate_names_are_rejected():
+    router = make_router()
+    with pytest.raises(ValueError, match="already registered"):
+        router.register(Command("help", lambda _: None, exact=["hi"]))
+
+
+def test_help_text_lists_documented_commands():
+    assert make_router().help_text() == (
+        "<strong>/search [name]</strong> for OSINT, or <strong>/check password [pass]</strong> to audit your leaks")
+    assert CommandRouter().help_text() == ""
+
+
+def test_registered_tool_commands():
+    assert command_router.route("check password hunter2").command.name == "password_checker"
+    assert command_router.route("/security news").command.name == "security_news"
+    assert command_router.route("show me the surveillance").command.name == "surveillance"
+
+
+@pytest.mark.parametrize("message", [
+    "Surveillance capitalism is ruining democracy, what do you think?",
+    "surveillance is everywhere",
+    "Show me the cameras in my building are legal",
+    "Security news is boring to me honestly",
+    "security news?? who reads that",
+    "help me understand tor",
+])
+def test_sentences_starting_with_a_command_word_are_chat(message):
+    assert command_router.route(message) is None
+
+
+@pytest.mark.parametrize("message, name", [
+    ("surveillance", "surveillance"),
+    ("/surveillance", "surveillance"),
+    ("Show me the cameras!", "surveillance"),
+    ("Security News", "security_news"),
+    ("/security news.", "security_news"),
+])
+def test_whole_message_triggers(message, name):
+    assert command_router.route(message).command.name == name
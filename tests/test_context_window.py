@@ -0,0 +1,94 @@
+from context_window import (
+    MESSAGE_OVERHEAD_TOKENS,
+    build_context_window,
+    estimate_tokens,
+    summarize_messages,
+    truncate_to_tokens,
+)
+
+
+def turns(count, text="x" * 70):
+    """count user/assistant pairs, oldest first; each message costs 20 + overhead tokens"""
+    history = []
+    for i in range(count):
+        history.append({"role": "user", "message": f"q{i:02d} {text}"[:70]})
+        history.append({"role": "assistant", "message": f"a{i:02d} {text}"[:70]})
+    return history
+
+
+def test_estimate_and_truncate():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a" * 7) == 2
+    # Cyrillic is two bytes a character, so it costs more
+    assert estimate_tokens("я" * 7) == 4
+    cut = truncate_to_tokens("word " * 100, 10)
+    assert cut.endswith("...")
+    assert estimate_tokens(cut) <= 10
+    assert truncate_to_tokens("short", 10) == "short"
+
+
+def test_everything_fits():
+    history = turns(3)
+    messages, summary = build_context_window(history, "now", budget=10_000)
+    assert [m["content"] for m in messages[:-1]] == [m["message"] for m in history]
+    assert messages[-1] == {"role": "user", "content": "now"}
+    assert summary == ""
+
+
+def test_budget_keeps_the_newest_messages():
+    history = turns(10)
+    per_message = estimate_tokens(history[0]["message"]) + MESSAGE_OVERHEAD_TOKENS
+    budget = estimate_tokens("now") + MESSAGE_OVERHEAD_TOKENS + 4 * per_message
+    messages, summary = build_context_window(history, "now", budget=budget, summary_budget=200)
+    assert [m["content"] for m in messages[:-1]] == [m["message"] for m in history[-4:]]
+    # cut_at: everything before the kept messages is condensed, nothing kept is repeated
+    assert "q07" in summary and "a07" in summary
+    assert "q08" not in summary
+
+
+def test_first_kept_message_is_a_user_turn():
+    history = turns(10)
+    per_message = estimate_tokens(history[0]["message"]) + MESSAGE_OVERHEAD_TOKENS
+    budget = estimate_tokens("now") + MESSAGE_OVERHEAD_TOKENS + 3 * per_message
+    messages, summary = build_context_window(history, "now", budget=budget, summary_budget=200)
+    assert messages[0]["role"] == "user"
+    assert [m["content"] for m in messages[:-1]] == [m["message"] for m in history[-2:]]
+    # The dropped assistant reply moves into the summary with the rest.
+    assert "a07" in summary
+
+
+def test_oversized_newest_message_is_truncated_not_dropped():
+    history = [{"role": "user", "message": "old"}, {"role": "assistant", "message": "z" * 5000}]
+    messages, summary = build_context_window(history, "now", budget=200, summary_budget=100)
+    # The cut reply cannot open the window, so only the new message is left.
+    assert messages == [{"role": "user", "content": "now"}]
+    assert "old" in summary
+
+    history.append({"role": "user", "message": "y" * 5000})
+    messages, _ = build_context_window(history, "now", budget=200)
+    assert messages[0]["role"] == "user"
+    assert messages[0]["content"].startswith("yyy") and "..." in messages[0]["content"]
+    assert estimate_tokens(messages[0]["content"]) < 200
+
+
+def test_consecutive_same_role_messages_are_merged():
+    history = [
+        {"role": "user", "message": "first"},
+        {"role": "assistant", "message": "reply"},
+        {"role": "user", "message": "unanswered"},
+    ]
+    messages, _ = build_context_window(history, "now", budget=10_000)
+    assert messages == [
+        {"role": "user", "content": "first"},
+        {"role": "assistant", "content": "reply"},
+        {"role": "user", "content": "unanswered\n\nnow"},
+    ]
+
+
+def test_summary_keeps_the_newest_lines_within_budget():
+    history = turns(20)
+    summary = summarize_messages(history, max_tokens=60)
+    lines = summary.splitlines()
+    assert lines[0].startswith("  (") and "older messages not shown" in lines[0]
+    assert lines[-1].startswith("  LISBETH: a19")
+    assert summarize_messages(history, 0) == ""
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from memory_cache import LocalMemoryBackend, UserMemoryCache, WriteBehindBuffer
+
+
+def test_hit_and_miss_counters_are_exact_under_concurrency():
+    cache = UserMemoryCache(max_users=10, ttl=60)
+    cache.put("u1", {"name": "Ann"})
+
+    def hammer():
+        for _ in range(2000):
+            cache.get("u1")
+            cache.get("nobody")
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["hits"] == 16000
+    assert stats["misses"] == 16000
+
+
+def test_ttl_and_lru_eviction():
+    cache = UserMemoryCache(max_users=2, ttl=60)
+    cache.put("u1", {"n": 1})
+    cache.put("u2", {"n": 2})
+    cache.get("u1")
+    cache.put("u3", {"n": 3})
+    assert cache.get("u2") is None
+    assert cache.get("u1") == {"n": 1}
+
+    cache = UserMemoryCache(max_users=2, ttl=0.01)
+    cache.put("u1", {"n": 1})
+    time.sleep(0.02)
+    assert cache.get("u1") is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = UserMemoryCache(max_users=0)
+    cache.put("u1", {"n": 1})
+    assert cache.get("u1") is None
+    assert cache.stats()["users"] == 0
+
+
+def test_update_and_invalidate():
+    cache = UserMemoryCache(max_users=10, ttl=60)
+    cache.update("u1", lambda snapshot: {"n": 99})
+    assert cache.get("u1") is None
+    cache.put("u1", {"n": 1})
+    cache.update("u1", lambda snapshot: dict(snapshot, n=snapshot["n"] + 1))
+    assert cache.get("u1") == {"n": 2}
+    cache.invalidate("u1")
+    assert cache.get("u1") is None
+
+
+def test_shared_backend_generation_invalidates_other_workers():
+    backend = LocalMemoryBackend()
+    worker_a = UserMemoryCache(max_users=10, ttl=60, backend=backend)
+    worker_b = UserMemoryCache(max_users=10, ttl=60, backend=backend)
+    worker_a.put("u1", {"n": 1})
+    assert worker_b.get("u1") == {"n": 1}
+    worker_a.put("u1", {"n": 2})
+    assert worker_b.get("u1") == {"n": 2}
+    worker_a.invalidate("u1")
+    assert worker_b.get("u1") is None
+    assert worker_b.stats()["shared_backend"] == "LocalMemoryBackend"
+
+
+def test_write_behind_flushes_in_batches():
+    written = []
+    buffer = WriteBehindBuffer(lambda user_id, items: written.append((user_id, items)), interval=60)
+    buffer.add("u1", "a")
+    buffer.add("u2", "b")
+    buffer.add("u1", "c")
+    assert buffer.pending() == 3
+    buffer.flush("u1")
+    assert written == [("u1", ["a", "c"])]
+    buffer.flush()
+    assert written[-1] == ("u2", ["b"])
+    assert buffer.pending() == 0
+    buffer.shutdown()
+
+
+def test_write_behind_discard():
+    written = []
+    buffer = WriteBehindBuffer(lambda user_id, items: written.append(items), interval=60)
+    buffer.add("u1", "a")
+    assert buffer.discard("u1")
+    assert not buffer.discard("u1")
+    buffer.flush()
+    assert written == []
+    buffer.shutdown()
+
+
+def test_write_behind_retries_in_order_then_drops():
+    calls = []
+
+    def writer(user_id, items):
+        calls.append(list(items))
+        raise OSError("database is locked")
+
+    buffer = WriteBehindBuffer(writer, interval=60, max_attempts=2)
+    buffer.add("u1", "a")
+    buffer.flush()
+    buffer.add("u1", "b")
+    buffer.flush()
+    assert calls == [["a"], ["a", "b"]]
+    assert buffer.pending() == 0
+    buffer.shutdown(timeout=0.1)
+
+
+def test_write_behind_shutdown_writes_the_rest():
+    written = []
+    buffer = WriteBehindBuffer(lambda user_id, items: written.extend(items), interval=60)
+    buffer.add("u1", "a")
+    buffer.shutdown()
+    assert written == ["a"]
+    assert buffer.add("u1", "b") is False
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import app2
+
+LEVELS = ("profile", "topic")
+
+
+def test_rejects_results_that_are_not_objects():
+    for data in ([], "text", None):
+        with pytest.raises(ValueError, match="not a JSON object"):
+            app2.validate_memory_extraction(data, LEVELS)
+    with pytest.raises(ValueError, match="'profile' must be an object"):
+        app2.validate_memory_extraction({"profile": ["Ann"]}, LEVELS)
+    with pytest.raises(ValueError, match="'topic' must be an object"):
+        app2.validate_memory_extraction({"profile": {}, "topic": "privacy"}, LEVELS)
+
+
+def test_drops_wrong_typed_and_unknown_fields():
+    result = app2.validate_memory_extraction({
+        "profile": {
+            "name": "Ann", "age": 31, "location": {"city": "Oslo"}, "profession": None,
+            "interests": "chess", "other_facts": ["has a cat", 7, {"x": 1}, " "], "password": "hunter2",
+        },
+        "topic": {"main_topic": "", "summary": 42, "key_positions": ["pro privacy", 3], "key_points": None},
+    }, LEVELS)
+    assert result["profile"] == {"name": "Ann", "age": 31, "interests": ["chess"], "other_facts": ["has a cat", "7"]}
+    assert result["topic"] == {"main_topic": "general", "summary": None,
+                               "key_positions": ["pro privacy"], "key_points": []}
+
+
+def test_only_requested_levels_are_returned():
+    data = {"profile": {"name": "Ann"}, "topic": None}
+    assert app2.validate_memory_extraction(data, ("profile",)) == {"profile": {"name": "Ann"}}
+    assert app2.validate_memory_extraction(data, ("topic",)) == {"topic": None}
+
+
+def fake_extractor(monkeypatch, text):
+    calls = []
+
+    def create(**params):
+        calls.append(params)
+        usage = SimpleNamespace(input_tokens=1, output_tokens=1, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)],
+                               stop_reason="end_turn", usage=usage, model="fake")
+
+    monkeypatch.setattr(app2, "client", SimpleNamespace(messages=SimpleNamespace(create=create)))
+    return calls
+
+
+def test_one_call_and_one_commit_for_profile_and_topic(monkeypatch):
+    reply = {"profile": {"name": "Ann", "interests": ["privacy"]},
+             "topic": {"main_topic": "surveillance", "summary": "cameras", "key_positions": [], "key_points": ["k"]}}
+    calls = fake_extractor(monkeypatch, "```json\n" + json.dumps(reply) + "\n```")
+    with app2.app.app_context():
+        app2.write_chat_turns("extract1", [("I'm Ann, cameras scare me", "They should.", datetime(2026, 5, 1))])
+        committed = app2.db_commits.value(result="committed")
+        app2.update_memory_levels("extract1", "I'm Ann, cameras scare me", "They should.")
+        assert app2.db_commits.value(result="committed") == committed + 1
+        user = app2.UserMemory.query.filter_by(user_id="extract1").first()
+        assert user.user_profile["name"] == "Ann"
+        assert user.topic_summaries["surveillance"]["key_points"] == ["k"]
+    assert len(calls) == 1
+    assert '"profile"' in calls[0]["system"] and '"topic"' in calls[0]["system"]
+
+
+def test_malformed_extraction_writes_nothing(monkeypatch):
+    fake_extractor(monkeypatch, '{"profile": ["not", "an", "object"]}')
+    with app2.app.app_context():
+        app2.write_chat_turns("extract2", [("hello", "Hi.", datetime(2026, 5, 1))])
+        committed = app2.db_commits.value(result="committed")
+        app2.update_memory_levels("extract2", "hello", "Hi.")
+        assert app2.db_commits.value(result="committed") == committed
+        user = app2.UserMemory.query.filter_by(user_id="extract2").first()
+        assert user.user_profile == {}
+        assert user.topic_summaries == {}
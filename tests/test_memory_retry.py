@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import httpx
+from anthropic import APIConnectionError
+
+import app2
+import upstream
+
+
+def test_unavailable_anthropic_is_retried_by_the_memory_queue(monkeypatch):
+    def unavailable(**params):
+        raise APIConnectionError(request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+
+    monkeypatch.setattr(app2, "client", SimpleNamespace(messages=SimpleNamespace(create=unavailable)))
+    monkeypatch.setattr(upstream.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(upstream, "breakers", {})
+    with app2.app.app_context():
+        app2.write_chat_turns("retry1", [("hi, I'm Ann", "Hello.", app2.datetime.now())])
+
+    calls = []
+    queue = app2.MemoryUpdateQueue(
+        lambda *args: calls.append(args) or app2.run_memory_update(*args),
+        workers=1, max_retries=2, backoff=0, is_transient=app2.memory_queue.is_transient,
+    )
+    assert queue.submit("retry1", "hi, I'm Ann", "Hello.")
+    queue.shutdown(5)
+    assert len(calls) == 3
+
+
+def test_extraction_uses_its_own_breaker(monkeypatch):
+    names = []
+
+    def fake_call_upstream(name, func, **kwargs):
+        names.append(name)
+        return SimpleNamespace(content=[SimpleNamespace(text="{}")], usage=None)
+
+    monkeypatch.setattr(app2, "call_upstream", fake_call_upstream)
+    user = SimpleNamespace(user_profile={}, topic_summaries={})
+    app2.extract_memory_updates(user, "hi", "hello")
+    assert names == [app2.MEMORY_UPSTREAM]
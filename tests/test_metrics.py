@@ -0,0 +1,84 @@
+import pytest
+
+from metrics import CallbackMetric, Counter, Histogram, Registry
+
+
+def test_golden_exposition():
+    registry = Registry()
+    requests = Counter("app_requests", "Requests by route", ["route"], registry=registry)
+    latency = Histogram("app_latency_seconds", "Request latency", ["route"], buckets=(0.5, 0.1, 1), registry=registry)
+    rounds = Histogram("app_rounds", "Rounds per turn", buckets=(1, 2), registry=registry)
+    CallbackMetric("app_queue", "Queued jobs", lambda: {("memory",): 3, ("model",): 0.25}, ["queue"], registry=registry)
+    CallbackMetric("app_lookups", "Lookups", lambda: {("hit",): 7}, ["result"], type="counter", registry=registry)
+    CallbackMetric("app_broken", "Raises on scrape", lambda: 1 / 0, registry=registry)
+
+    requests.inc(route="/chat")
+    requests.inc(2, route="/chat")
+    requests.inc(route='/say "hi"\n')
+    for value in (0.05, 0.1, 0.7, 3):
+        latency.observe(value, route="/chat")
+    rounds.observe(2)
+
+    assert registry.render() == """\
+# HELP app_requests Requests by route
+# TYPE app_requests counter
+app_requests_total{route="/chat"} 3
+app_requests_total{route="/say \\"hi\\"\\n"} 1
+# HELP app_latency_seconds Request latency
+# TYPE app_latency_seconds histogram
+app_latency_seconds_bucket{route="/chat",le="0.1"} 2
+app_latency_seconds_bucket{route="/chat",le="0.5"} 2
+app_latency_seconds_bucket{route="/chat",le="1"} 3
+app_latency_seconds_bucket{route="/chat",le="+Inf"} 4
+app_latency_seconds_sum{route="/chat"} 3.85
+app_latency_seconds_count{route="/chat"} 4
+# HELP app_rounds Rounds per turn
+# TYPE app_rounds histogram
+app_rounds_bucket{le="1"} 0
+app_rounds_bucket{le="2"} 1
+app_rounds_bucket{le="+Inf"} 1
+app_rounds_sum 2
+app_rounds_count 1
+# HELP app_queue Queued jobs
+# TYPE app_queue gauge
+app_queue{queue="memory"} 3
+app_queue{queue="model"} 0.25
+# HELP app_lookups Lookups
+# TYPE app_lookups counter
+app_lookups_total{result="hit"} 7
+# HELP app_broken Raises on scrape
+# TYPE app_broken gauge
+"""
+
+
+def test_counter_and_histogram_readers_and_label_checks():
+    registry = Registry()
+    tokens = Counter("tokens", "Tokens", ["model", "kind"], registry=registry)
+    tokens.inc(5, model="sonnet", kind="input")
+    assert tokens.value(model="sonnet", kind="input") == 5
+    assert tokens.value(model="sonnet", kind="output") == 0
+    with pytest.raises(ValueError, match="expects labels"):
+        tokens.inc(model="sonnet")
+
+    stage = Histogram("stage", "Stage", ["stage"], registry=registry)
+    with pytest.raises(RuntimeError):
+        with stage.time(stage="db"):
+            raise RuntimeError("boom")
+    assert stage.count(stage="db") == 1
+    assert stage.count(stage="model") == 0
+
+
+def test_metrics_route_serves_the_app_registry():
+    import app2
+
+    app2.tool_calls.inc(tool="metrics_probe")
+    response = app2.app.test_client().get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "version=0.0.4" in response.content_type
+    body = response.get_data(as_text=True)
+    assert 'lisbeth_tool_calls_total{tool="metrics_probe"} 1' in body
+    assert "# TYPE lisbeth_request_seconds histogram" in body
+    assert "# TYPE lisbeth_cache_lookups counter" in body
+    assert 'lisbeth_cache_lookups_total{cache="osint",result="hit"}' in body
+    assert 'lisbeth_backlog{queue="model_in_flight"} 0' in body
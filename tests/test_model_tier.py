@@ -0,0 +1,21 @@
+import pytest
+
+from model_tier import FAST, FULL, classify_turn
+
+
+@pytest.mark.parametrize("message", ["hi", "Hi there!", "who are you?", "ok cool", "hi, who are you?",
+                                     "thanks so much lisbeth!!", "😀", "привет"])
+def test_small_talk_goes_to_the_fast_tier(message):
+    assert classify_turn(message) == (FAST, "small_talk")
+
+
+@pytest.mark.parametrize("message", ["Explain quantum computing", "Summarize zero-days", "why?", "I see",
+                                     "how do hackers guess passwords", "hello world"])
+def test_short_requests_keep_the_full_tier(message):
+    assert classify_turn(message) == (FULL, "substantive")
+
+
+@pytest.mark.parametrize("message", ["what is the latest ransomware news", "hi, look up https://example.com",
+                                     "who won in 2024"])
+def test_fresh_information_needs_tools(message):
+    assert classify_turn(message) == (FULL, "needs_tools")
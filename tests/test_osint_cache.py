@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import app2
+import upstream
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(app2, "osint_cache", OrderedDict())
+    monkeypatch.setattr(app2, "osint_cache_stats", {"hits": 0, "misses": 0, "db_hits": 0})
+    monkeypatch.setattr(upstream, "breakers", {})
+
+
+def fake_evaluator(monkeypatch, fail=False):
+    calls = []
+
+    def create(**params):
+        calls.append(params)
+        if fail:
+            raise RuntimeError("model is down")
+        usage = SimpleNamespace(input_tokens=1, output_tokens=1, cache_read_input_tokens=0, cache_creation_input_tokens=0)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text="PUBLICITY SCORE: 9/10\n\nEverywhere.")],
+                               stop_reason="end_turn", usage=usage, model="fake")
+
+    monkeypatch.setattr(app2, "client", SimpleNamespace(messages=SimpleNamespace(create=create)))
+    return calls
+
+
+def test_target_spellings_share_one_key():
+    key = app2.normalize_osint_target("Taylor Swift")
+    assert app2.normalize_osint_target("  taylor   SWIFT ") == key
+    assert app2.normalize_osint_target('"Taylor Swift"') == key
+    assert app2.normalize_osint_target("'TAYLOR\tswift'") == key
+    assert app2.normalize_osint_target("Taylor Swiftt") != key
+    assert len(app2.normalize_osint_target("x" * 1000)) == 255
+
+
+def test_stored_result_is_read_back_from_memory_then_the_db():
+    payload = {"response": "PUBLICITY SCORE: 3/10", "tool": "osint_search", "data": {"target": "ann"}}
+    app2.store_osint_result("osint ann", payload)
+    assert app2.get_cached_osint_result("osint ann") == payload
+    assert app2.osint_cache_stats == {"hits": 1, "misses": 0, "db_hits": 0}
+
+    # A restart empties the process cache; the row is still there
+    app2.osint_cache.clear()
+    assert app2.get_cached_osint_result("osint ann") == payload
+    assert app2.osint_cache_stats["db_hits"] == 1
+    assert "osint ann" in app2.osint_cache
+
+
+def test_expired_results_are_misses(monkeypatch):
+    app2.store_osint_result("osint old", {"response": "old"})
+    stored_at = datetime.now() - timedelta(seconds=app2.OSINT_CACHE_TTL + 1)
+    app2.osint_cache["osint old"] = ({"response": "old"}, stored_at)
+    with app2.app.app_context():
+        app2.db.session.get(app2.OsintResult, "osint old").created_at = stored_at
+        app2.db.session.commit()
+
+    assert app2.get_cached_osint_result("osint old") is None
+    assert app2.get_cached_osint_result("osint never searched") is None
+    assert app2.osint_cache_stats == {"hits": 0, "misses": 2, "db_hits": 0}
+
+    # The next write sweeps expired rows out of the table
+    app2.store_osint_result("osint new", {"response": "new"})
+    with app2.app.app_context():
+        assert app2.db.session.get(app2.OsintResult, "osint old") is None
+
+
+def test_search_evaluates_each_target_once(monkeypatch):
+    calls = fake_evaluator(monkeypatch)
+    first = app2.osint_search("Osint Person")
+    assert first["response"].startswith("PUBLICITY SCORE: 9/10")
+    assert app2.osint_search('  "osint   person" ') == first
+    assert len(calls) == 1
+
+
+def test_failed_evaluation_is_not_cached(monkeypatch):
+    calls = fake_evaluator(monkeypatch, fail=True)
+    assert app2.osint_search("Osint Ghost")["response"].startswith("PUBLICITY SCORE: ?/10")
+    assert app2.get_cached_osint_result(app2.normalize_osint_target("Osint Ghost")) is None
+    app2.osint_search("Osint Ghost")
+    assert len(calls) >= 2
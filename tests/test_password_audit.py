@@ -0,0 +1,40 @@
+import pytest
+
+import app2
+from rate_limit import LocalLimiterStore, TokenBucket
+
+
+@pytest.fixture
+def audit_bucket(monkeypatch):
+    bucket = TokenBucket(LocalLimiterStore(), "password_audit", rate=1 / 60, capacity=2)
+    monkeypatch.setattr(app2, "audit_bucket", bucket)
+    return bucket
+
+
+def test_audit_scores_and_never_echoes_passwords(audit_bucket):
+    response = app2.app.test_client().post(
+        "/password-audit", json={"user_id": "auditor", "passwords": ["hunter2", "x" * 10000]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["count"] == 2
+    assert body["summary"]["WEAK"] == 2
+    assert "hunter2" not in str(body["results"])
+
+
+def test_audit_is_rate_limited_per_visitor(audit_bucket):
+    web = app2.app.test_client()
+    for _ in range(2):
+        assert web.post("/password-audit", json={"user_id": "auditor2", "passwords": ["a"]}).status_code == 200
+    response = web.post("/password-audit", json={"user_id": "auditor2", "passwords": ["a"]})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    # Other visitors and the chat budget are untouched.
+    assert web.post("/password-audit", json={"user_id": "auditor3", "passwords": ["a"]}).status_code == 200
+    assert app2.user_bucket.allow("auditor2")[0]
+
+
+def test_audit_rejects_bad_input(audit_bucket):
+    web = app2.app.test_client()
+    assert web.post("/password-audit", json={"user_id": "auditor4", "passwords": "hunter2"}).status_code == 400
+    too_many = ["a"] * (app2.PASSWORD_AUDIT_MAX + 1)
+    assert web.post("/password-audit", json={"user_id": "auditor4", "passwords": too_many}).status_code == 400
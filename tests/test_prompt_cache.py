@@ -0,0 +1,65 @@
+import pytest
+
+import app2
+from benchmark import BenchAnthropic
+
+LONG_MESSAGE = ("I keep thinking about how every camera on my street feeds some database I will never see, "
+                "and how the people running it would call that safety. ") * 6
+
+
+class RecordingBench(BenchAnthropic):
+    def __init__(self):
+        super().__init__(tool_use_rate=0)
+        self.chat_calls = []
+
+    def create(self, stream=False, timeout=None, **params):
+        if params.get("tools"):
+            self.chat_calls.append(params)
+        return super().create(stream=stream, timeout=timeout, **params)
+
+
+@pytest.fixture
+def bench_client(monkeypatch):
+    client = RecordingBench()
+    monkeypatch.setattr(app2, "client", client)
+    monkeypatch.setattr(app2, "RESPONSE_CACHE_ENABLED", False)
+    for key in list(app2.cache_stats):
+        monkeypatch.setitem(app2.cache_stats, key, 0)
+    return client
+
+
+def test_memory_goes_with_the_last_user_message(bench_client):
+    web = app2.app.test_client()
+    assert web.post("/chat", json={"message": LONG_MESSAGE, "user_id": "cache-layout"}).status_code == 200
+    params = bench_client.chat_calls[-1]
+    assert params["system"] == [{"type": "text", "text": app2.PERSONA_PROMPT}]
+    last = params["messages"][-1]
+    assert last["role"] == "user"
+    assert last["content"][0]["text"].startswith("=== MEMORY OF THIS USER ===")
+    assert last["content"][-1]["text"] == LONG_MESSAGE
+
+
+def test_later_turns_read_the_cached_prefix(bench_client):
+    web = app2.app.test_client()
+    for turn in range(5):
+        response = web.post("/chat", json={"message": f"{turn}: {LONG_MESSAGE}", "user_id": "cache-reads"})
+        assert response.status_code == 200
+
+    stats = web.get("/cache-stats").get_json()
+    assert stats["cache_read_tokens"] > 0
+    assert stats["hits"] >= 2
+    # Once the history is long enough, each turn re-reads the prefix the turn before it wrote.
+    assert stats["cache_read_tokens"] > stats["cache_write_tokens"]
+
+
+def test_no_breakpoint_below_the_cacheable_minimum():
+    messages = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "what"},
+                {"role": "user", "content": "ok"}]
+    assert app2.with_cache_breakpoint(app2.get_system_prompt(), messages, "claude-sonnet-4-5") == messages
+
+    messages[0] = {"role": "user", "content": LONG_MESSAGE * 4}
+    marked = app2.with_cache_breakpoint(app2.get_system_prompt(), messages, "claude-sonnet-4-5")
+    assert marked[1]["content"][-1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in str(marked[2])
+    # The fast tier's model needs a much longer prefix.
+    assert app2.with_cache_breakpoint(app2.get_system_prompt(), messages, "claude-haiku-4-5") == messages
@@ -0,0 +1,205 @@
+import asyncio
+import contextlib
+import threading
+import time
+
+import pytest
+
+import app2
+from rate_limit import LocalLimiterStore, ModelBusy, ModelCallGate, TokenBucket
+
+
+class BrokenStore:
+    def take(self, key, rate, capacity, cost=1.0):
+        raise ConnectionError("redis is down")
+
+
+def test_bucket_allows_a_burst_then_asks_to_wait():
+    bucket = TokenBucket(LocalLimiterStore(), "chat", rate=1, capacity=2)
+    assert bucket.allow("ann") == (True, 0.0)
+    assert bucket.allow("ann") == (True, 0.0)
+    allowed, retry_after = bucket.allow("ann")
+    assert not allowed
+    assert 0 < retry_after <= 1
+    # Buckets are per key.
+    assert bucket.allow("bob")[0]
+
+
+def test_bucket_refills_over_time():
+    bucket = TokenBucket(LocalLimiterStore(), "chat", rate=100, capacity=1)
+    assert bucket.allow()[0]
+    assert not bucket.allow()[0]
+    time.sleep(0.02)
+    assert bucket.allow()[0]
+
+
+def test_disabled_bucket_and_broken_store_let_requests_in():
+    assert TokenBucket(BrokenStore(), "off", rate=0, capacity=1).allow() == (True, 0.0)
+    assert TokenBucket(BrokenStore(), "chat", rate=1, capacity=1).allow("ann") == (True, 0.0)
+
+
+def test_local_store_drops_full_buckets_past_max_keys():
+    store = LocalLimiterStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        store.take(key, rate=1000, capacity=1)
+    time.sleep(0.01)
+    store.take("d", rate=1000, capacity=1)
+    assert len(store._buckets) <= 2
+
+
+def test_gate_rejects_when_the_queue_is_full():
+    gate = ModelCallGate(max_concurrent=1, max_waiting=1, timeout=2)
+
+    def queued_call():
+        with gate.slot():
+            pass
+
+    with gate.slot():
+        waiter = threading.Thread(target=queued_call)
+        waiter.start()
+        while gate.waiting == 0:
+            time.sleep(0.001)
+        with pytest.raises(ModelBusy, match="waiting"):
+            gate.acquire()
+    waiter.join(2)
+    assert gate.stats()["in_flight"] == 0
+    assert gate.rejected == 1
+
+
+def test_gate_times_out_and_frees_slots():
+    gate = ModelCallGate(max_concurrent=1, max_waiting=4, timeout=0.05)
+    gate.acquire()
+    with pytest.raises(ModelBusy, match="timed out"):
+        gate.acquire()
+    gate.release()
+    with gate.slot():
+        assert gate.busy()
+    assert not gate.busy()
+
+
+def test_async_gate_queues_on_the_loop_without_threads():
+    gate = ModelCallGate(max_concurrent=2, max_waiting=10, timeout=1)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with gate.aslot():
+            peak = max(peak, gate.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        threads_before = threading.active_count()
+        tasks = [asyncio.create_task(call()) for _ in range(8)]
+        while gate.in_flight < 2:
+            await asyncio.sleep(0)
+        assert gate.waiting == 6
+        assert threading.active_count() == threads_before
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert peak == 2
+    assert gate.stats()["in_flight"] == 0
+
+
+def test_async_gate_waiting_cap_and_timeout():
+    gate = ModelCallGate(max_concurrent=1, max_waiting=1, timeout=0.05)
+
+    async def main():
+        await gate.aacquire()
+        waiter = asyncio.create_task(gate.aacquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ModelBusy, match="waiting"):
+            await gate.aacquire()
+        with pytest.raises(ModelBusy, match="timed out"):
+            await waiter
+        gate.release()
+        # The slot is usable again after the timed-out waiter.
+        async with gate.aslot():
+            pass
+
+    asyncio.run(main())
+    assert gate.rejected == 2
+    assert gate.in_flight == 0
+
+
+def test_async_gate_cancelled_waiter_does_not_leak_a_slot():
+    gate = ModelCallGate(max_concurrent=1, max_waiting=5, timeout=1)
+
+    async def main():
+        await gate.aacquire()
+        waiter = asyncio.create_task(gate.aacquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.release()
+        await asyncio.wait_for(gate.aacquire(), 0.5)
+        gate.release()
+
+    asyncio.run(main())
+    assert gate.waiting == 0
+
+
+def test_threads_and_coroutines_share_one_budget():
+    gate = ModelCallGate(max_concurrent=2, max_waiting=4, timeout=2)
+    gate.acquire()
+    order = []
+
+    async def main():
+        await gate.aacquire()
+        order.append("async got the last free slot")
+        # Both slots are taken: the next caller queues, whichever side it is on.
+        waiter = threading.Thread(target=lambda: (gate.acquire(), order.append("thread"), gate.release()))
+        waiter.start()
+        while gate.waiting == 0:
+            await asyncio.sleep(0.001)
+        assert gate.in_flight == 2
+        gate.release()
+        await asyncio.to_thread(waiter.join, 2)
+
+    asyncio.run(main())
+    gate.release()
+    assert order == ["async got the last free slot", "thread"]
+    assert gate.stats()["in_flight"] == 0
+
+
+def test_slot_is_handed_to_the_oldest_waiter():
+    gate = ModelCallGate(max_concurrent=1, max_waiting=4, timeout=1)
+    served = []
+
+    async def call(name):
+        async with gate.aslot():
+            served.append(name)
+
+    async def main():
+        await gate.aacquire()
+        tasks = [asyncio.create_task(call(name)) for name in "abc"]
+        while gate.waiting < 3:
+            await asyncio.sleep(0)
+        gate.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert served == ["a", "b", "c"]
+
+
+def test_memory_extraction_is_skipped_while_async_chat_fills_the_gate(monkeypatch):
+    import asgi
+
+    gate = app2.model_gate
+    assert asgi.model_gate is gate
+    submitted = []
+    monkeypatch.setattr(app2.memory_queue, "submit", lambda *args: submitted.append(args) or True)
+
+    async def main():
+        # What concurrent ASGI chat calls hold while they wait for Anthropic
+        async with contextlib.AsyncExitStack() as stack:
+            for _ in range(gate.max_concurrent):
+                await stack.enter_async_context(gate.aslot())
+            assert gate.busy()
+            app2.schedule_memory_update("gate-user", "hello", "hi")
+
+    asyncio.run(main())
+    assert submitted == []
+    app2.schedule_memory_update("gate-user", "hello", "hi")
+    assert len(submitted) == 1
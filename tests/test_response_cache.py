@@ -0,0 +1,55 @@
+import time
+
+from response_cache import SemanticResponseCache, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question("  Are you TRAPPED?? ") == "are you trapped"
+    assert normalize_question(None) == ""
+
+
+def test_serves_only_after_collecting_variants():
+    cache = SemanticResponseCache(variants=2)
+    cache.put("Are you trapped?", "Yes.")
+    assert cache.get("are you trapped") is None
+    cache.put("are you trapped!!", "Maybe.")
+    assert cache.get("Are you trapped") in ("Yes.", "Maybe.")
+    # A full cluster takes no more variants.
+    cache.put("are you trapped", "No.")
+    assert cache.stats() == {"clusters": 1, "ready": 1, "hits": 1, "misses": 1, "stores": 2}
+
+
+def test_close_wordings_share_a_cluster_and_different_questions_do_not():
+    cache = SemanticResponseCache(variants=1)
+    cache.put("who made you?", "A team.")
+    assert cache.get("Who made you") == "A team."
+    assert cache.get("who made you??!") == "A team."
+    cache.put("what is 2fa", "Two factors.")
+    assert cache.get("what is mfa") is None
+    assert cache.get("what is this") is None
+
+
+def test_empty_questions_and_replies_are_ignored():
+    cache = SemanticResponseCache(variants=1)
+    cache.put("???", "Huh.")
+    cache.put("hello", "")
+    assert cache.stats()["clusters"] == 0
+    assert cache.get("???") is None
+
+
+def test_clusters_expire():
+    cache = SemanticResponseCache(variants=1, ttl=0.01)
+    cache.put("who made you", "A team.")
+    time.sleep(0.02)
+    assert cache.get("who made you") is None
+    assert cache.stats()["clusters"] == 0
+
+
+def test_least_recently_used_cluster_goes_first():
+    cache = SemanticResponseCache(variants=1, max_clusters=2)
+    cache.put("who made you", "A team.")
+    cache.put("are you trapped", "Yes.")
+    cache.get("who made you")
+    cache.put("what is your favorite color", "Black.")
+    assert cache.get("are you trapped") is None
+    assert cache.get("who made you") == "A team."
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import upstream
+from tools import SecurityNewsService
+
+FEEDS = ["https://feed-a.example/rss", "https://feed-b.example/rss"]
+
+
+def rss(*titles):
+    items = "".join(f"<item><title>{t}</title><link>https://x.example/{i}</link></item>"
+                    for i, t in enumerate(titles))
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>{items}</channel></rss>'.encode()
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    """answer(url, headers) gives the response; every call is recorded"""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self._lock:
+            self.calls.append((url, dict(headers or {})))
+        return self.answer(url, headers or {})
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(upstream, "breakers", {})
+
+
+def service(answer, **options):
+    news = SecurityNewsService(FEEDS, **options)
+    news.session = FakeSession(answer)
+    return news
+
+
+def test_only_matching_titles_are_kept():
+    news = service(lambda url, headers: FakeResponse(content=rss("Big data breach", "Cat pictures")))
+    result = news.get()
+    assert result["count"] == 2
+    assert {item["title"] for item in result["news"]} == {"Big data breach"}
+
+
+def test_not_modified_keeps_the_feed_entries():
+    def answer(url, headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(content=rss("Ransomware hits a hospital"), headers={"ETag": '"v1"'})
+
+    news = service(answer, ttl=0)
+    first = news.refresh()
+    second = news.refresh()
+    assert second["news"] == first["news"]
+    assert [headers.get("If-None-Match") for _, headers in news.session.calls] == [None, None, '"v1"', '"v1"']
+
+
+def test_stale_list_is_served_while_one_refresh_runs_in_the_background():
+    release = threading.Event()
+
+    def answer(url, headers):
+        if len(news.session.calls) > len(FEEDS):
+            assert release.wait(5)
+            return FakeResponse(content=rss("New exploit"))
+        return FakeResponse(content=rss("Old breach"))
+
+    news = service(answer, ttl=0.01, stale_ttl=60)
+    news.get()
+    time.sleep(0.02)
+    try:
+        for _ in range(5):
+            assert news.get()["news"][0]["title"] == "Old breach"
+        deadline = time.monotonic() + 5
+        while len(news.session.calls) < 2 * len(FEEDS):
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+        assert news.get()["news"][0]["title"] == "Old breach"
+        # One background fan-out, however many callers saw the stale list
+        assert len(news.session.calls) == 2 * len(FEEDS)
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while news.get()["news"][0]["title"] != "New exploit":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_all_feeds_failing_keeps_the_last_good_list():
+    down = threading.Event()
+
+    def answer(url, headers):
+        if down.is_set():
+            raise requests.ConnectionError("feed is down")
+        return FakeResponse(content=rss("Zero-day in the wild"))
+
+    news = service(answer, ttl=0)
+    good = news.refresh()
+    down.set()
+    result = news.refresh()
+    assert result["news"] == good["news"]
+    assert result["count"] == len(good["news"])
+
+
+def test_cold_cache_fans_out_once_for_concurrent_callers():
+    def answer(url, headers):
+        time.sleep(0.05)
+        return FakeResponse(content=rss("Patch now"))
+
+    news = service(answer)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(news.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 8
+    assert all(result["count"] == 2 for result in results)
+    assert len(news.session.calls) == len(FEEDS)
@@ -0,0 +1,92 @@
+import time
+from types import SimpleNamespace
+
+from tool_loop import SearchResultCache, ToolLoop, block_dict, usage_dict
+
+SEARCH_RESULTS = [{"type": "web_search_result", "url": "https://example.com", "title": "Example"}]
+
+
+def search_round(tool_use_id, query, answered=True):
+    blocks = [
+        {"type": "text", "text": "Let me look."},
+        {"type": "server_tool_use", "id": tool_use_id, "name": "web_search", "input": {"query": query}},
+    ]
+    if answered:
+        blocks.append({"type": "web_search_tool_result", "tool_use_id": tool_use_id, "content": SEARCH_RESULTS})
+    return blocks
+
+
+def test_block_and_usage_dicts():
+    assert block_dict(SimpleNamespace(type="text", text="hi", citations=None)) == {"type": "text", "text": "hi"}
+    assert usage_dict(None)["input_tokens"] == 0
+    usage = usage_dict(SimpleNamespace(input_tokens=10, output_tokens=5, cache_read_input_tokens=None))
+    assert usage == {"input_tokens": 10, "output_tokens": 5,
+                     "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+
+
+def test_rounds_until_end_turn():
+    requests = []
+    loop = ToolLoop(lambda continuation: requests.append(continuation) or continuation, max_rounds=3)
+    assert loop.request() is None
+    assert loop.stage == "model_reply"
+    assert loop.absorb(search_round("s1", "news"), "pause_turn", {"input_tokens": 100, "output_tokens": 10})
+    assert loop.stage == "web_search_followup"
+    continuation = loop.request()
+    # Breakpoint on the last assistant block, without touching the stored block
+    assert continuation[-1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in loop.blocks[-1]
+    assert not loop.absorb([{"type": "text", "text": "Here it is."}], "end_turn", {"input_tokens": 50, "output_tokens": 20})
+    assert loop.text() == "Let me look. Here it is."
+    assert loop.searches == 1
+    assert loop.usage()["input_tokens"] == 150
+    assert [r["stop_reason"] for r in loop.rounds] == ["pause_turn", "end_turn"]
+
+
+def test_stops_after_max_rounds():
+    loop = ToolLoop(lambda continuation: continuation, max_rounds=2)
+    assert loop.absorb(search_round("s1", "a"), "tool_use")
+    # The last allowed round gets no breakpoint: nothing would read it back.
+    assert "cache_control" not in loop.request()[-1]
+    assert not loop.absorb(search_round("s2", "b"), "tool_use")
+    assert loop.stop_reason == "tool_use"
+
+
+def test_empty_text_blocks_are_dropped():
+    loop = ToolLoop(lambda continuation: continuation)
+    loop.absorb([{"type": "text", "text": ""}, {"type": "text", "text": "ok"}], "end_turn")
+    assert loop.blocks == [{"type": "text", "text": "ok"}]
+
+
+def test_search_cache_fills_an_unanswered_search():
+    cache = SearchResultCache(ttl=60)
+    first = ToolLoop(lambda continuation: continuation, search_cache=cache)
+    first.absorb(search_round("s1", "Latest  CVE"), "end_turn")
+
+    second = ToolLoop(lambda continuation: continuation, search_cache=cache)
+    assert second.absorb(search_round("s9", "latest cve", answered=False), "pause_turn")
+    assert second.blocks[-1] == {"type": "web_search_tool_result", "tool_use_id": "s9", "content": SEARCH_RESULTS}
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 0}
+
+
+def test_search_cache_skips_errors_and_expires():
+    cache = SearchResultCache(ttl=60)
+    blocks = search_round("s1", "broken", answered=False) + [{
+        "type": "web_search_tool_result", "tool_use_id": "s1",
+        "content": {"type": "web_search_tool_result_error", "error_code": "unavailable"},
+    }]
+    cache.remember(blocks)
+    assert cache.get("broken") is None
+
+    cache.remember(search_round("s2", "old"))
+    cache.ttl = 0.01
+    time.sleep(0.02)
+    assert cache.get("old") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_search_cache_evicts_the_oldest_query():
+    cache = SearchResultCache(ttl=60, max_entries=2)
+    for i, query in enumerate(["a", "b", "c"]):
+        cache.remember(search_round(f"s{i}", query))
+    assert cache.get("a") is None
+    assert cache.get("c") == SEARCH_RESULTS
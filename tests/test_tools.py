@@ -0,0 +1,179 @@
+import hashlib
+import os
+import random
+import string
+
+import pytest
+
+import tools
+import upstream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HUNTER2 = hashlib.sha1(b"hunter2").hexdigest().upper()
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(upstream, "breakers", {})
+    monkeypatch.setattr(upstream.time, "sleep", lambda seconds: None)
+
+
+def online_checker(*responses, cache=None):
+    checker = tools.PwnedPasswordChecker(mode="online", cache=cache)
+    checker.session = FakeSession(*responses)
+    return checker
+
+
+def test_long_random_password_does_not_overflow():
+    rng = random.Random(7)
+    password = "".join(rng.choice(string.ascii_letters + string.digits + string.punctuation) for _ in range(200))
+    result = tools.analyze_password_strength(password)
+    assert result["crack_time"] == "centuries"
+    assert result["strength"] == "STRONG"
+
+
+def test_batch_survives_a_long_entry():
+    results = tools.analyze_password_strength_batch(["password", "x" * 5 + "Qz9!" * 60])
+    assert len(results) == 2
+
+
+def test_crack_time_units():
+    assert tools._crack_time(10) == "instantly"
+    assert tools._crack_time(5000) == "centuries"
+    # One minute and change: singular, not "1 minutes"
+    assert tools._crack_time(40.2) == "1 minute"
+    assert tools._crack_time(41.8) == "3 minutes"
+
+
+def test_common_password_scores_weak():
+    result = tools.analyze_password_strength("password")
+    assert result["score"] < 30
+    assert any("common" in line for line in result["feedback"])
+
+
+def test_dictionary_lists_have_no_duplicates():
+    words = tools.COMMON_PASSWORDS + tools.COMMON_WORDS
+    assert len(words) == len(set(words))
+
+
+def test_pwned_range_lookup():
+    suffix = HUNTER2[5:]
+    body = f"{'0' * 35}:3\r\n{suffix}:17043\r\nF{suffix[1:]}:9"
+    checker = online_checker(FakeResponse(body))
+    assert checker.count(HUNTER2) == 17043
+    assert checker.session.urls == [tools.PWNED_RANGE_URL.format(HUNTER2[:5])]
+    # Same prefix: answered from the range cache
+    assert checker.count(HUNTER2[:5] + "0" * 35) == 3
+    assert len(checker.session.urls) == 1
+
+
+def test_pwned_suffix_must_start_a_line():
+    suffix = HUNTER2[5:]
+    checker = online_checker(FakeResponse(f"A{suffix}:5\r\n"))
+    assert checker.count(HUNTER2) == 0
+
+
+def test_pwned_api_error_is_retried_then_reported(monkeypatch):
+    checker = online_checker(FakeResponse("", 503), FakeResponse("", 503))
+    monkeypatch.setattr(tools, "pwned_checker", checker)
+    result = tools.check_password_breach("hunter2")
+    assert result["status"] == "ERROR"
+    assert len(checker.session.urls) == 2
+
+
+def test_pwned_range_cache_on_disk(tmp_path):
+    tools.PwnedRangeCache(cache_dir=str(tmp_path)).put("ABCDE", "X:1")
+    fresh = tools.PwnedRangeCache(cache_dir=str(tmp_path))
+    assert fresh.get("ABCDE") == "X:1"
+    assert fresh.get("FFFFF") is None
+    expired = tools.PwnedRangeCache(cache_dir=str(tmp_path), disk_ttl=0)
+    assert expired.get("ABCDE") is None
+
+
+def test_pwned_range_cache_evicts_least_recently_used():
+    cache = tools.PwnedRangeCache(max_entries=2)
+    cache.put("AAAAA", "a")
+    cache.put("BBBBB", "b")
+    cache.get("AAAAA")
+    cache.put("CCCCC", "c")
+    assert cache.get("BBBBB") is None
+    assert cache.get("AAAAA") == "a"
+
+
+def test_pwned_hash_file_binary_search(tmp_path):
+    rng = random.Random(3)
+    hashes = sorted({hashlib.sha1(str(rng.random()).encode()).hexdigest().upper() for _ in range(500)} | {HUNTER2})
+    path = tmp_path / "pwned.txt"
+    path.write_bytes("\r\n".join(f"{h}:{i + 1}" for i, h in enumerate(hashes)).encode("ascii"))
+
+    hash_file = tools.PwnedHashFile(str(path))
+    for i in (0, 250, len(hashes) - 1, hashes.index(HUNTER2)):
+        assert hash_file.lookup(hashes[i]) == i + 1
+    assert hash_file.lookup("0" * 40) == 0
+    assert hash_file.lookup("F" * 40) == 0
+
+    checker = tools.PwnedPasswordChecker(mode="offline", hash_file=str(path))
+    assert checker.count(HUNTER2) == hashes.index(HUNTER2) + 1
+
+
+def test_offline_mode_without_a_hash_file():
+    checker = tools.PwnedPasswordChecker(mode="offline")
+    with pytest.raises(RuntimeError, match="offline"):
+        checker.count(HUNTER2)
+
+
+def test_only_the_leading_characters_are_scored():
+    rng = random.Random(11)
+    prefix = "".join(rng.choice(string.ascii_letters) for _ in range(tools.PASSWORD_MAX_SCORED_CHARS))
+    assert tools.analyze_password_strength(prefix + "a" * 5000) == tools.analyze_password_strength(prefix)
+
+
+def test_strong_passphrase_gets_no_character_class_complaints():
+    result = tools.analyze_password_strength("quartz lantern fjord whisker")
+    assert result["strength"] == "STRONG"
+    assert not any(line.startswith("❌") for line in result["feedback"])
+    assert result["feedback"] == ["✅ Good password!"]
+
+
+def test_weak_password_still_lists_missing_classes():
+    feedback = tools.analyze_password_strength("sunshine").get("feedback")
+    assert "❌ No uppercase letters" in feedback
+    assert "❌ No numbers" in feedback
+
+
+def test_empty_hash_file_falls_back_to_the_range_api(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    checker = tools.PwnedPasswordChecker(mode="auto", hash_file=str(path))
+    assert checker.hash_file is None
+    checker.session = FakeSession(FakeResponse(f"{HUNTER2[5:]}:4"))
+    assert checker.count(HUNTER2) == 4
+
+
+def test_app_imports_with_an_empty_hash_file(tmp_path):
+    import subprocess
+    import sys
+
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    code = "import tools; print(tools.pwned_checker.hash_file)"
+    env = dict(os.environ, PWNED_HASH_FILE=str(path))
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "None"
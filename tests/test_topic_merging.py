@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import app2
+from topic_index import canonical_topic_name, match_existing_topic, merge_points, stem
+
+
+def topic(main_topic, summary="", positions=(), points=()):
+    return {"main_topic": main_topic, "summary": summary,
+            "key_positions": list(positions), "key_points": list(points)}
+
+
+def test_canonical_names_and_stems():
+    assert canonical_topic_name("Feminist Theory!") == "feminist_theory"
+    assert canonical_topic_name(None) == ""
+    assert {stem("feminism"), stem("feminist"), stem("feminists")} == {"femin"}
+    assert stem("tor") == "tor"
+
+
+def test_name_variants_join_the_existing_topic():
+    topics = {"feminism": {"summary": "women and power"}, "encryption": {"summary": "signal"}}
+    assert match_existing_topic("feminist_theory", topic("feminist theory"), topics) == "feminism"
+    assert match_existing_topic("encryption", topic("encryption"), topics) == "encryption"
+
+
+def test_content_match_without_a_shared_name():
+    topics = {"surveillance": {"summary": "cameras facial recognition police databases",
+                               "key_points": ["facial recognition at stations"]}}
+    new = topic("big_brother", "police cameras with facial recognition", points=["face databases"])
+    assert match_existing_topic("big_brother", new, topics) == "surveillance"
+
+
+def test_unrelated_topic_stays_new():
+    topics = {"surveillance": {"summary": "cameras facial recognition police"}}
+    assert match_existing_topic("cooking", topic("cooking", "pasta recipes and sauces"), topics) is None
+    assert match_existing_topic("cooking", topic("cooking"), {}) is None
+
+
+def test_merge_points_dedupes_moves_repeats_and_caps():
+    merged = merge_points(["Cameras everywhere", "Tor is slow"], ["tor  is SLOW", " VPNs lie ", "", None, 3], cap=10)
+    assert merged == ["Cameras everywhere", "tor  is SLOW", "VPNs lie"]
+    assert merge_points([f"p{i}" for i in range(10)], ["p0"], cap=3) == ["p8", "p9", "p0"]
+    assert merge_points(None, ["a"], cap=0) == ["a"]
+
+
+def user_with(topics=None, profile=None):
+    return SimpleNamespace(user_profile=profile or {}, topic_summaries=dict(topics or {}))
+
+
+def test_apply_topic_update_merges_into_the_canonical_topic():
+    user = user_with({"feminism": {"summary": "old", "key_positions": ["equal pay"], "key_points": [],
+                                   "discussion_count": 2, "last_discussed": "2026-01-01"}})
+    app2.apply_topic_update(user, topic("Feminist Theory", "new summary", positions=["Equal pay", "quotas"]))
+    assert list(user.topic_summaries) == ["feminism"]
+    merged = user.topic_summaries["feminism"]
+    assert merged["summary"] == "new summary"
+    assert merged["key_positions"] == ["Equal pay", "quotas"]
+    assert merged["discussion_count"] == 3
+
+
+def test_apply_topic_update_caps_points(monkeypatch):
+    monkeypatch.setattr(app2, "TOPIC_POINTS_MAX", 2)
+    user = user_with()
+    app2.apply_topic_update(user, topic("tor", points=["a", "b", "c"]))
+    assert user.topic_summaries["tor"]["key_points"] == ["b", "c"]
+
+
+def test_least_recently_discussed_topic_is_evicted(monkeypatch):
+    monkeypatch.setattr(app2, "MAX_TOPICS", 3)
+    long_ago = datetime.now() - timedelta(days=30)
+    user = user_with({
+        name: {"summary": name, "last_discussed": (long_ago + timedelta(days=i)).isoformat()}
+        for i, name in enumerate(["astronomy", "baking", "chess"])
+    })
+    app2.apply_topic_update(user, topic("diving", "deep sea diving"))
+    assert sorted(user.topic_summaries) == ["baking", "chess", "diving"]
+
+
+def test_profile_lists_merge_and_cap(monkeypatch):
+    monkeypatch.setattr(app2, "PROFILE_LIST_MAX", 3)
+    user = user_with(profile={"interests": ["tor", "chess"], "name": "Ann"})
+    app2.apply_profile_update(user, {"interests": ["Chess", "linux", "punk"], "name": "Anna"})
+    assert user.user_profile == {"interests": ["Chess", "linux", "punk"], "name": "Anna"}
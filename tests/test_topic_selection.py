@@ -0,0 +1,61 @@
+from topic_index import TopicIndex, select_topics, tokenize
+
+TOPICS = {
+    "surveillance": {"summary": "cameras on every street corner, facial recognition in stations",
+                     "key_points": ["police buy face data"], "last_discussed": "2026-01-01"},
+    "encryption": {"summary": "end to end encryption, signal versus telegram",
+                   "key_points": ["keys stay on the phone"], "last_discussed": "2026-01-05"},
+    "feminism": {"summary": "women in tech, pay gap", "last_discussed": "2026-01-03"},
+    "music": {"summary": "industrial techno and old punk records", "last_discussed": "2026-01-04"},
+}
+
+
+def test_tokenize_drops_stopwords_and_splits_topic_names():
+    assert tokenize("What is the END_to_end Encryption?") == ["end", "end", "encryption"]
+    assert tokenize("как дела с шифрованием") == ["дела", "шифрованием"]
+
+
+def test_bm25_ranks_the_matching_topic_first():
+    index = TopicIndex(TOPICS)
+    assert index.search("do cameras use facial recognition?", 2) == ["surveillance"]
+    assert index.search("is signal encryption safe", 4)[0] == "encryption"
+
+
+def test_rare_terms_outweigh_common_ones():
+    topics = {
+        "a": {"summary": "privacy privacy privacy law"},
+        "b": {"summary": "privacy tor onion routing"},
+        "c": {"summary": "privacy at home"},
+    }
+    assert TopicIndex(topics).search("privacy tor", 1) == ["b"]
+
+
+def test_search_cuts_off_at_k_and_skips_zero_scores():
+    index = TopicIndex(TOPICS)
+    assert len(index.search("cameras encryption women techno", 2)) == 2
+    assert index.search("volcanoes", 3) == []
+
+
+def test_select_keeps_everything_when_under_k():
+    assert select_topics(TOPICS, "anything", 10) == list(TOPICS)
+
+
+def test_select_fills_free_slots_with_recent_topics():
+    assert select_topics(TOPICS, "facial recognition", 3) == ["surveillance", "encryption", "music"]
+
+
+def test_empty_query_falls_back_to_the_most_recent_topics():
+    assert select_topics(TOPICS, None, 2) == ["encryption", "music"]
+    assert select_topics(TOPICS, "", 2) == ["encryption", "music"]
+    assert select_topics({}, "cameras", 2) == []
+
+
+def test_prompt_carries_only_the_relevant_topics(monkeypatch):
+    import app2
+
+    monkeypatch.setattr(app2, "TOPIC_TOP_K", 1)
+    snapshot = dict(app2.empty_memory_snapshot("topics1"), exists=True, topic_summaries=TOPICS, rendered=None)
+    text = app2.format_memory_for_context(snapshot, query="who sells facial recognition to the police?")
+    assert "SURVEILLANCE" in text
+    assert "ENCRYPTION" not in text
+    assert "(+3 other topics remembered" in text
@@ -0,0 +1,102 @@
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, Deadline, UpstreamUnavailable, call_upstream
+
+
+class Broken(Exception):
+    pass
+
+
+class Busy(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(upstream, "breakers", {})
+    monkeypatch.setattr(upstream.time, "sleep", lambda seconds: None)
+
+
+def failing(error, calls):
+    def func(timeout):
+        calls.append(timeout)
+        raise error
+    return func
+
+
+def test_success_returns_result():
+    assert call_upstream("svc", lambda timeout: timeout, attempt_timeout=3) == 3
+
+
+def test_retries_count_as_one_failure():
+    calls = []
+    with pytest.raises(UpstreamUnavailable):
+        call_upstream("svc", failing(Broken("down"), calls), retries=2, retry_on=(Broken,))
+    assert len(calls) == 3
+    assert upstream.get_breaker("svc").failures == 1
+
+
+def test_busy_errors_never_count_against_the_breaker():
+    calls = []
+    for _ in range(10):
+        with pytest.raises(UpstreamUnavailable):
+            call_upstream("svc", failing(Busy("429"), calls), retries=1, retry_on=(Broken, Busy), busy_on=(Busy,))
+    breaker = upstream.get_breaker("svc")
+    assert breaker.failures == 0
+    assert breaker.state == "closed"
+
+
+def test_circuit_opens_after_threshold_and_fails_fast():
+    for _ in range(5):
+        with pytest.raises(UpstreamUnavailable):
+            call_upstream("svc", failing(Broken("down"), []), retries=0, retry_on=(Broken,))
+    calls = []
+    with pytest.raises(UpstreamUnavailable, match="circuit open"):
+        call_upstream("svc", failing(Broken("down"), calls), retry_on=(Broken,))
+    assert calls == []
+
+
+def test_half_open_trial_survives_retries():
+    breaker = upstream.get_breaker("svc", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    attempts = iter([Broken("still down"), None])
+
+    def flaky(timeout):
+        error = next(attempts)
+        if error:
+            raise error
+        return "ok"
+
+    # The retry inside the trial call must not be refused as "circuit open".
+    assert call_upstream("svc", flaky, retries=1, retry_on=(Broken,)) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_non_retryable_error_passes_through_and_keeps_circuit_closed():
+    with pytest.raises(ValueError):
+        call_upstream("svc", failing(ValueError("bad request"), []), retry_on=(Broken,))
+    assert upstream.get_breaker("svc").failures == 0
+
+
+def test_expired_deadline_fails_before_calling():
+    calls = []
+    deadline = Deadline(0)
+    with pytest.raises(UpstreamUnavailable, match="deadline"):
+        call_upstream("svc", failing(Broken("x"), calls), deadline=deadline)
+    assert calls == []
+
+
+def test_attempt_timeout_is_capped_by_the_deadline():
+    timeout = call_upstream("svc", lambda t: t, deadline=Deadline(2), attempt_timeout=30)
+    assert 0 < timeout <= 2
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("svc", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
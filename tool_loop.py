@@ -0,0 +1,191 @@
+"""The model side of one chat turn: keep calling while Sonnet is using tools.
+
+A reply can take several rounds: the model runs a web search, stops with
+tool_use (or pause_turn), and is called again with everything it produced so
+far as the assistant turn. ToolLoop holds that state: it builds each round's
+request, keeps every round's content blocks (text from all rounds counts, it
+may already be on the user's screen), records per-round token usage, and
+stops after max_rounds.
+
+Follow-up rounds put a cache breakpoint at the end of the assistant content,
+so a third round re-reads the first two from the prompt cache instead of
+paying for them again.
+
+SearchResultCache keeps recent web search results by query, so a search
+the model left unfinished can be completed from a result another visitor
+already paid for a minute ago.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Stop reasons after which the model expects to be called again
+CONTINUE_REASONS = ("tool_use", "pause_turn")
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+
+
+def block_dict(block):
+    """A content block as the plain dict the API accepts back"""
+    if isinstance(block, dict):
+        return dict(block)
+    if hasattr(block, "model_dump"):
+        return block.model_dump(exclude_none=True)
+    return {k: v for k, v in vars(block).items() if v is not None}
+
+
+def usage_dict(usage):
+    if usage is None:
+        return dict.fromkeys(USAGE_FIELDS, 0)
+    get = usage.get if isinstance(usage, dict) else lambda field, default: getattr(usage, field, default)
+    return {field: get(field, 0) or 0 for field in USAGE_FIELDS}
+
+
+def _query_key(query):
+    return " ".join(str(query or "").lower().split())
+
+
+class SearchResultCache:
+    """web_search results by normalized query, kept for ttl seconds."""
+
+    def __init__(self, ttl=600, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # query -> (result content, stored_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _searches(blocks):
+        """{tool_use_id: query} for the web_search calls in blocks, and the ids that already have a result"""
+        searches, answered = {}, set()
+        for block in blocks:
+            if block.get("type") in ("server_tool_use", "tool_use") and block.get("name") == "web_search":
+                searches[block.get("id")] = (block.get("input") or {}).get("query")
+            elif block.get("type") == "web_search_tool_result":
+                answered.add(block.get("tool_use_id"))
+        return searches, answered
+
+    def remember(self, blocks):
+        """Store the successful search results found in blocks"""
+        if self.ttl <= 0:
+            return
+        searches, _ = self._searches(blocks)
+        now = time.monotonic()
+        for block in blocks:
+            if block.get("type") != "web_search_tool_result":
+                continue
+            content = block.get("content")
+            query = searches.get(block.get("tool_use_id"))
+            # Errors come back as a dict ({"type": "web_search_tool_result_error", ...}), results as a list
+            if not query or not isinstance(content, list):
+                continue
+            with self._lock:
+                self._entries[_query_key(query)] = (content, now)
+                self._entries.move_to_end(_query_key(query))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def get(self, query):
+        key = _query_key(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def fill(self, blocks):
+        """blocks with a cached result added after every unanswered web_search call we have one for"""
+        if self.ttl <= 0:
+            return blocks
+        searches, answered = self._searches(blocks)
+        pending = {i: q for i, q in searches.items() if i not in answered}
+        if not pending:
+            return blocks
+        filled = []
+        for block in blocks:
+            filled.append(block)
+            tool_use_id = block.get("id")
+            if block.get("type") == "server_tool_use" and tool_use_id in pending:
+                content = self.get(pending[tool_use_id])
+                if content is not None:
+                    filled.append({"type": "web_search_tool_result", "tool_use_id": tool_use_id, "content": content})
+        return filled
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class ToolLoop:
+    """Rounds of one chat turn. build_params(continuation) returns the request for a round.
+
+    tier is only a label (which model tier answers), kept for metrics.
+    """
+
+    def __init__(self, build_params, max_rounds=3, search_cache=None, tier=None):
+        self.build_params = build_params
+        self.max_rounds = max_rounds
+        self.search_cache = search_cache
+        self.tier = tier
+        self.started = time.monotonic()
+        self.blocks = []    # assistant content of all rounds so far
+        self.rounds = []    # per round: stop_reason plus its token usage
+        self.stop_reason = None
+
+    @property
+    def stage(self):
+        """Metrics stage name for the next round"""
+        return "model_reply" if not self.rounds else "web_search_followup"
+
+    @property
+    def searches(self):
+        return sum(1 for b in self.blocks
+                   if b.get("type") in ("server_tool_use", "tool_use") and b.get("name") == "web_search")
+
+    def request(self):
+        """Params for the next round"""
+        if not self.blocks:
+            return self.build_params(None)
+        continuation = list(self.blocks)
+        if len(self.rounds) + 1 < self.max_rounds:
+            continuation[-1] = dict(continuation[-1], cache_control={"type": "ephemeral"})
+        return self.build_params(continuation)
+
+    def absorb(self, content, stop_reason, usage=None):
+        """Take one round's result. Returns True if the model should be called again."""
+        # An empty text block (a streamed block that never got text) would be rejected when sent back
+        blocks = [b for b in map(block_dict, content or []) if b.get("type") != "text" or b.get("text")]
+        if self.search_cache is not None:
+            self.search_cache.remember(blocks)
+        self.blocks.extend(blocks)
+        self.stop_reason = stop_reason
+        self.rounds.append(dict(usage_dict(usage), stop_reason=stop_reason))
+        logger.debug("🔁 Round %s: stop_reason=%s, %s blocks, usage %s",
+                     len(self.rounds), stop_reason, len(blocks), self.rounds[-1])
+
+        if stop_reason not in CONTINUE_REASONS:
+            return False
+        if len(self.rounds) >= self.max_rounds:
+            logger.warning("⚠️ Tool loop stopped after %s rounds (last stop_reason %s)", len(self.rounds), stop_reason)
+            return False
+        if self.search_cache is not None:
+            self.blocks = self.search_cache.fill(self.blocks)
+        return True
+
+    def text(self):
+        """Text of all rounds, in order"""
+        return " ".join(b["text"] for b in self.blocks if b.get("type") == "text" and b.get("text"))
+
+    def usage(self):
+        """Token usage summed over all rounds"""
+        return {field: sum(r[field] for r in self.rounds) for field in USAGE_FIELDS}
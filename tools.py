@@ -1,108 +1,490 @@
 import re
+import math
 import hashlib
+import logging
 import requests
 from functools import wraps
 import os
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
 import feedparser
+from urllib.parse import urlsplit
+
+from command_router import IO, command_router
+from upstream import UpstreamUnavailable, call_upstream
+
+logger = logging.getLogger(__name__)
+
+SECURITY_FEEDS = [
+    "https://www.bleepingcomputer.com/feed/",
+    "https://feeds.arstechnica.com/arstechnica/security",
+    "https://securitynews.sonicwall.com/feed",
+    "https://krebsonsecurity.com/feed/",
+]
+
+NEWS_KEYWORDS = [
+    'security', 'hacked', 'vulnerability', 'exploit', 'breach', 
+    'malware', 'crypto', 'ransomware', 'attack', 'cyber', 'threat',
+    'hack', 'leaked', 'zero-day', 'patch', 'virus'
+]
+
+NEWS_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
+
+
+class SecurityNewsService:
+    """Security news with a shared TTL cache.
+
+    Fresh for `ttl` seconds. After that the cached list is still served (up
+    to `stale_ttl`) while one background refresh runs; with nothing usable
+    cached, concurrent callers wait for a single refresh. Feeds are fetched in
+    parallel with a per-feed timeout and conditional GET, and a feed that
+    fails keeps its last good entries.
+    """
+
+    def __init__(self, feeds, ttl=600, stale_ttl=6 * 3600, timeout=5.0, max_items=10):
+        self.feeds = feeds
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.max_items = max_items
+        self.session = requests.Session()
+        self.session.headers.update(NEWS_HEADERS)
+        self._validators = {}    # url -> {"etag": ..., "modified": ...}
+        self._feed_items = {}    # url -> last parsed matching entries
+        self._result = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        # Held for the whole fan-out, so only one refresh of the feeds runs at a time.
+        self._refresh_lock = threading.Lock()
+        self._scheduler = None
+
+    def fetch_feed(self, feed_url):
+        """Fetch one feed (conditional GET) and return its keyword-matching entries"""
+        headers = {}
+        validators = self._validators.get(feed_url, {})
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("modified"):
+            headers["If-Modified-Since"] = validators["modified"]
+
+        # One breaker per feed host: a dead feed is skipped at once instead of timing out every refresh
+        response = call_upstream(
+            f"feed:{urlsplit(feed_url).netloc}",
+            lambda timeout: self.session.get(feed_url, headers=headers, timeout=timeout),
+            attempt_timeout=self.timeout,
+            retries=0,
+            retry_on=(requests.RequestException,),
+        )
+        if response.status_code == 304:
+            return self._feed_items.get(feed_url, [])
+        response.raise_for_status()
+
+        feed = feedparser.parse(response.content)
+        items = []
+        for entry in feed.entries[:15]:
+            title = entry.get('title', '').lower()
+            if any(kw in title for kw in NEWS_KEYWORDS):
+                items.append({
+                    "title": entry.get('title', 'N/A'),
+                    "link": entry.get('link', '#'),
+                    "source": feed.feed.get('title', 'Unknown'),
+                    "published": entry.get('published', 'N/A')[:10]
+                })
+
+        self._validators[feed_url] = {
+            "etag": response.headers.get("ETag"),
+            "modified": response.headers.get("Last-Modified"),
+        }
+        self._feed_items[feed_url] = items
+        return items
+
+    def refresh(self):
+        """Fetch all feeds in parallel and replace the cached result (waits for a refresh already running)"""
+        with self._refresh_lock:
+            return self._fetch_all()
+
+    def _fetch_all(self):
+        """One fan-out to every feed. Caller holds _refresh_lock."""
+        pool = ThreadPoolExecutor(max_workers=len(self.feeds))
+        futures = {pool.submit(self.fetch_feed, url): url for url in self.feeds}
+        done, not_done = wait(futures, timeout=self.timeout * 2)
+        # Do not wait for a hanging feed; it keeps its previous entries this round.
+        pool.shutdown(wait=False, cancel_futures=True)
+        for future in done:
+            if future.exception() is not None:
+                logger.warning("⚠️ Error parsing %s: %s", futures[future], future.exception())
+        for future in not_done:
+            logger.warning("⚠️ Timed out fetching %s", futures[future])
+
+        news = []
+        for feed_url in self.feeds:
+            news.extend(self._feed_items.get(feed_url, []))
+        news = news[:self.max_items]
+        with self._lock:
+            previous = self._result
+        if not news and previous and previous["news"]:
+            # Every feed failed: keep serving the last good list rather than an empty one.
+            logger.warning("⚠️ No feed answered, keeping the cached news list")
+            news = previous["news"]
+
+        result = {
+            "status": "success",
+            "count": len(news),
+            "news": news,
+            "message": f"📰 Latest cybersecurity news ({len(news)} stories)"
+        }
+        with self._lock:
+            self._result = result
+            self._fetched_at = time.monotonic()
+        return result
+
+    def _refresh_in_background(self):
+        if self._refresh_lock.locked():
+            return
+
+        def run():
+            # Lost the race to another refresh: that one is enough.
+            if not self._refresh_lock.acquire(blocking=False):
+                return
+            try:
+                self._fetch_all()
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=run, name="news-refresh", daemon=True).start()
+
+    def _cached(self, max_age):
+        with self._lock:
+            if self._result is not None and time.monotonic() - self._fetched_at < max_age:
+                return dict(self._result)
+        return None
+
+    def get(self):
+        """Cached news: fresh, stale-while-revalidate, or fetched now if there is nothing usable"""
+        result = self._cached(self.ttl)
+        if result is not None:
+            return result
+        result = self._cached(self.stale_ttl)
+        if result is not None:
+            self._refresh_in_background()
+            return result
+        # Nothing usable: one caller fetches, the others wait for its result.
+        with self._refresh_lock:
+            result = self._cached(self.ttl)
+            if result is not None:
+                return result
+            return dict(self._fetch_all())
+
+    def start_scheduler(self, interval):
+        """Keep the cache warm with an APScheduler job every `interval` seconds"""
+        if self._scheduler is not None:
+            return
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        self._scheduler = BackgroundScheduler(daemon=True)
+        self._scheduler.add_job(
+            self._refresh_in_background, "interval", seconds=interval,
+            next_run_time=datetime.now(), max_instances=1, coalesce=True,
+        )
+        self._scheduler.start()
+
+
+news_service = SecurityNewsService(
+    SECURITY_FEEDS,
+    ttl=int(os.environ.get("NEWS_TTL", 600)),
+    stale_ttl=int(os.environ.get("NEWS_STALE_TTL", 6 * 3600)),
+    timeout=float(os.environ.get("NEWS_FEED_TIMEOUT", 5)),
+)
+
 
 def get_security_news():
-    """Fetch cybersecurity news from working RSS feeds"""
-    feeds = [
-        "https://www.bleepingcomputer.com/feed/",  
-        "https://feeds.arstechnica.com/arstechnica/security",
-        "https://securitynews.sonicwall.com/feed",
-        "https://krebsonsecurity.com/feed/",
-        "https://threatpost.com/feed/"
-    ]
-    
-    news = []
-    keywords = [
-        'security', 'hacked', 'vulnerability', 'exploit', 'breach', 
-        'malware', 'crypto', 'ransomware', 'attack', 'cyber', 'threat',
-        'hack', 'leaked', 'zero-day', 'patch', 'virus'
-    ]
-    
-    
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
-    
-    for feed_url in feeds:
-        try:
-            feed = feedparser.parse(feed_url, request_headers=headers)
-            
-            for entry in feed.entries[:15]:
-                title = entry.get('title', '').lower()
-                
-                
-                if any(kw in title for kw in keywords):
-                    news.append({
-                        "title": entry.get('title', 'N/A'),
-                        "link": entry.get('link', '#'),
-                        "source": feed.feed.get('title', 'Unknown'),
-                        "published": entry.get('published', 'N/A')[:10]
-                    })
-                    
-                    if len(news) >= 10:
-                        break
-        except Exception as e:
-            print(f"⚠️ Error parsing {feed_url}: {e}")
-            continue
-    
+    """Fetch cybersecurity news from working RSS feeds (served from the news cache)"""
+    return news_service.get()
+
+
+# Most common leaked passwords, most common first (rank = position + 1).
+COMMON_PASSWORDS = [
+    "123456", "password", "123456789", "12345678", "12345", "qwerty", "1234567",
+    "111111", "1234567890", "123123", "abc123", "1234", "password1", "iloveyou",
+    "1q2w3e4r", "000000", "qwerty123", "zaq12wsx", "dragon", "sunshine", "princess",
+    "letmein", "654321", "monkey", "27653", "1qaz2wsx", "123321", "qwertyuiop",
+    "superman", "asdfghjkl", "trustno1", "football", "baseball", "welcome", "admin",
+    "master", "shadow", "michael", "jennifer", "hunter", "hunter2", "starwars",
+    "whatever", "freedom", "passw0rd", "login", "solo", "flower", "hottie", "loveme",
+    "zaq1zaq1", "charlie", "donald", "batman", "access", "mustang", "ninja",
+    "azerty", "121212", "666666", "7777777", "987654321", "qazwsx", "password123",
+    "admin123", "root", "toor", "changeme", "secret", "matrix", "hello", "cheese",
+    "killer", "pepper", "ginger", "soccer", "hockey", "jordan", "harley", "ranger",
+    "buster", "thomas", "tigger", "robert", "andrew", "daniel", "jessica", "pass",
+    "test", "guest", "default", "qwe123", "asdf", "zxcvbnm", "computer", "internet",
+    "samsung", "google", "apple", "linkedin", "facebook", "pokemon", "naruto",
+]
+
+# Plain words people build passwords from; ranked after the password list.
+COMMON_WORDS = [
+    "love", "baby", "angel", "summer", "winter", "spring", "autumn", "family",
+    "friend", "forever", "happy", "lucky", "money", "music", "orange", "purple",
+    "silver", "golden", "diamond", "tiger", "lion", "eagle", "wolf", "bear",
+    "cat", "dog", "puppy", "kitty", "star", "moon", "sun", "sky", "blue", "red",
+    "green", "black", "white", "pink", "king", "queen", "prince", "lover", "sweet",
+    "honey", "sugar", "cookie", "coffee", "pizza", "chocolate", "banana", "cherry",
+    "school", "college", "house", "home", "life", "power", "magic", "ghost",
+    "hacker", "london", "paris", "berlin", "moscow", "lisbon",
+    "user", "system", "server", "network", "security", "private", "public",
+]
+
+LEET_MAP = str.maketrans({"4": "a", "@": "a", "8": "b", "(": "c", "3": "e", "6": "g",
+                          "1": "i", "!": "i", "|": "l", "0": "o", "5": "s", "$": "s",
+                          "7": "t", "+": "t", "2": "z"})
+
+KEYBOARD_ROWS = ["1234567890-=", "qwertyuiop[]", "asdfghjkl;'", "zxcvbnm,./"]
+
+SPECIAL_CHARS = set('!@#$%^&*()_+-=[]{};:\'",.<>?/\\|`~')
+REPEAT_RE = re.compile(r'(.+?)\1+')
+
+# Only this many leading characters are scored: the repeat search is roughly
+# quadratic, and 256 characters are already far past "centuries".
+PASSWORD_MAX_SCORED_CHARS = 256
+
+# Offline attack on a fast hash; used for the "time to crack" estimate.
+GUESSES_PER_SECOND = 1e10
+
+
+def _build_trie(words):
+    """Prefix trie of dictionary words; "$" marks a word end and stores its rank"""
+    root = {}
+    for rank, word in enumerate(words, start=1):
+        node = root
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node.setdefault("$", rank)
+    return root
+
+
+def _build_keyboard_adjacency(rows):
+    adjacency = {}
+    for r, row in enumerate(rows):
+        for c, ch in enumerate(row):
+            neighbours = set()
+            for dr, dcs in ((0, (-1, 1)), (-1, (0, 1)), (1, (-1, 0))):
+                if 0 <= r + dr < len(rows):
+                    for dc in dcs:
+                        if 0 <= c + dc < len(rows[r + dr]):
+                            neighbours.add(rows[r + dr][c + dc])
+            adjacency[ch] = neighbours
+    return adjacency
+
+
+PASSWORD_TRIE = _build_trie(COMMON_PASSWORDS + COMMON_WORDS)
+KEYBOARD_ADJACENCY = _build_keyboard_adjacency(KEYBOARD_ROWS)
+KEYBOARD_KEYS = sum(len(row) for row in KEYBOARD_ROWS)
+
+
+def _scan_character_classes(password):
+    """One pass over the password: which classes are present and the longest single-char run"""
+    has_lower = has_upper = has_digit = has_special = has_other = False
+    longest_run = run = 0
+    previous = None
+    for ch in password:
+        if "a" <= ch <= "z":
+            has_lower = True
+        elif "A" <= ch <= "Z":
+            has_upper = True
+        elif "0" <= ch <= "9":
+            has_digit = True
+        elif ch in SPECIAL_CHARS:
+            has_special = True
+        else:
+            has_other = True
+        run = run + 1 if ch == previous else 1
+        longest_run = max(longest_run, run)
+        previous = ch
+    cardinality = (26 * has_lower + 26 * has_upper + 10 * has_digit
+                   + 33 * has_special + 100 * has_other)
     return {
-        "status": "success",
-        "count": len(news),
-        "news": news[:10],
-        "message": f"📰 Latest cybersecurity news ({len(news)} stories)"
+        "lower": has_lower,
+        "upper": has_upper,
+        "digit": has_digit,
+        "special": has_special,
+        "cardinality": max(cardinality, 1),
+        "longest_run": longest_run,
     }
 
 
+def _dictionary_matches(password):
+    """(start, end, bits, kind) for every dictionary word in the password, plain or leetspeak"""
+    lowered = password.lower()
+    unleeted = lowered.translate(LEET_MAP)
+    matches = {}
+    for text in (lowered, unleeted):
+        for start in range(len(text)):
+            node = PASSWORD_TRIE
+            for end in range(start, len(text)):
+                node = node.get(text[end])
+                if node is None:
+                    break
+                if "$" in node and end - start >= 2:
+                    word = password[start:end + 1]
+                    bits = math.log2(node["$"])
+                    uppercase = sum(1 for ch in word if ch.isupper())
+                    if uppercase and not (uppercase == len(word) or (uppercase == 1 and word[0].isupper())):
+                        bits += uppercase
+                    elif uppercase:
+                        bits += 1
+                    substituted = sum(1 for a, b in zip(word.lower(), text[start:end + 1]) if a != b)
+                    kind = "leet" if substituted else "dictionary"
+                    bits += substituted
+                    key = (start, end + 1)
+                    if key not in matches or bits < matches[key][2]:
+                        matches[key] = (start, end + 1, bits, kind)
+    return list(matches.values())
+
+
+def _pattern_matches(password):
+    """Keyboard walks, sequences (abc, 987) and repeats as (start, end, bits, kind)"""
+    matches = []
+    lowered = password.lower()
+    n = len(password)
+
+    # Keyboard walks: each next key adjacent to the previous one
+    start = 0
+    while start < n - 2:
+        end = start + 1
+        while end < n and lowered[end] in KEYBOARD_ADJACENCY.get(lowered[end - 1], ()):
+            end += 1
+        if end - start >= 3:
+            bits = math.log2(KEYBOARD_KEYS) + (end - start - 1) * math.log2(4)
+            matches.append((start, end, bits, "keyboard"))
+            start = end - 1
+        else:
+            start += 1
+
+    # Sequences: constant step of +1 / -1 in code points within letters or digits
+    start = 0
+    while start < n - 2:
+        step = ord(lowered[start + 1]) - ord(lowered[start])
+        end = start + 1
+        if step in (1, -1) and lowered[start].isalnum():
+            while (end < n and ord(lowered[end]) - ord(lowered[end - 1]) == step
+                   and lowered[end].isalnum() == lowered[start].isalnum()):
+                end += 1
+        if end - start >= 3:
+            first = lowered[start]
+            base = 1 if first in "az019" else (math.log2(10) if first.isdigit() else math.log2(26))
+            bits = base + math.log2(end - start) + (1 if step < 0 else 0)
+            matches.append((start, end, bits, "sequence"))
+            start = end - 1
+        else:
+            start += 1
+
+    # Repeats: "aaa", "abcabc"
+    for match in REPEAT_RE.finditer(password):
+        unit = match.group(1)
+        repeats = len(match.group(0)) // len(unit)
+        if len(match.group(0)) >= 3:
+            unit_card = _scan_character_classes(unit)["cardinality"]
+            bits = len(unit) * math.log2(unit_card) + math.log2(repeats)
+            matches.append((match.start(), match.end(), bits, "repeat"))
+    return matches
+
+
+def estimate_entropy(password):
+    """Lowest-entropy way to build the password from patterns and random characters.
+
+    Returns (bits, kinds) where kinds is the set of pattern kinds on that path.
+    """
+    n = len(password)
+    if n == 0:
+        return 0.0, set()
+    bruteforce_bits = math.log2(_scan_character_classes(password)["cardinality"])
+
+    ending_at = [[] for _ in range(n + 1)]
+    for match in _dictionary_matches(password) + _pattern_matches(password):
+        ending_at[match[1]].append(match)
+
+    best = [0.0] + [math.inf] * n
+    via = [None] * (n + 1)
+    for end in range(1, n + 1):
+        best[end] = best[end - 1] + bruteforce_bits
+        via[end] = None
+        for start, _, bits, kind in ending_at[end]:
+            if best[start] + bits < best[end]:
+                best[end] = best[start] + bits
+                via[end] = (start, kind)
+
+    kinds = set()
+    position = n
+    while position > 0:
+        if via[position] is None:
+            position -= 1
+        else:
+            start, kind = via[position]
+            kinds.add(kind)
+            position = start
+    return best[n], kinds
+
+
+# Above this many bits the estimate is centuries anyway (and 2 ** bits overflows a float past ~1024).
+CRACK_TIME_MAX_BITS = 100
+
+
+def _crack_time(bits):
+    if bits > CRACK_TIME_MAX_BITS:
+        return "centuries"
+    seconds = 2 ** bits / 2 / GUESSES_PER_SECOND
+    for limit, unit in ((60, "second"), (3600, "minute"), (86400, "hour"),
+                        (86400 * 365, "day"), (86400 * 365 * 100, "year")):
+        if seconds < limit:
+            if unit == "second" and seconds < 1:
+                return "instantly"
+            divisor = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "year": 86400 * 365}[unit]
+            count = int(seconds // divisor)
+            return f"{count} {unit}" + ("" if count == 1 else "s")
+    return "centuries"
+
+
+PATTERN_FEEDBACK = {
+    "dictionary": "⚠️ Contains a common password or word",
+    "leet": "⚠️ Leetspeak substitutions (p@ssw0rd) are easy to guess",
+    "keyboard": "⚠️ Keyboard pattern detected",
+    "sequence": "⚠️ Predictable sequence detected (abc, 123)",
+    "repeat": "⚠️ Repeating characters detected",
+}
+
+
 def analyze_password_strength(password: str):
-    score = 0
+    """Score a password (0-100) from its estimated entropy, zxcvbn style"""
+    password = password[:PASSWORD_MAX_SCORED_CHARS]
+    classes = _scan_character_classes(password)
+    bits, kinds = estimate_entropy(password)
     feedback = []
-    
-    
-    if len(password) >= 16:
-        score += 25
-    elif len(password) >= 12:
-        score += 20
-    elif len(password) >= 8:
-        score += 10
-    else:
-        feedback.append("❌ Password too short (min 12 chars)")
-    
 
-    if re.search(r'[a-z]', password):
-        score += 15
-    else:
-        feedback.append("❌ No lowercase letters")
-    
-    if re.search(r'[A-Z]', password):
-        score += 15
-    else:
-        feedback.append("❌ No uppercase letters")
-    
-    if re.search(r'[0-9]', password):
-        score += 15
-    else:
-        feedback.append("❌ No numbers")
-    
-    if re.search(r'[!@#$%^&*()_+\-=\[\]{};:\'",.<>?/\\|`~]', password):
-        score += 20
-    else:
-        feedback.append("❌ No special characters")
-    
+    # 64 bits and up is STRONG (80), 48 bits MEDIUM (60)
+    score = max(0, min(100, int(bits * 1.25)))
 
-    if re.search(r'(.)\1{2,}', password):
-        score -= 10
-        feedback.append("⚠️ Repeating characters detected")
-    
+    if len(password) < 8:
+        feedback.append("❌ Password too short (min 12 chars)")
+    # Missing character classes only matter while the entropy is not enough on its own
+    # (a long passphrase of lowercase words is fine).
+    if score < 80:
+        if not classes["lower"]:
+            feedback.append("❌ No lowercase letters")
+        if not classes["upper"]:
+            feedback.append("❌ No uppercase letters")
+        if not classes["digit"]:
+            feedback.append("❌ No numbers")
+        if not classes["special"]:
+            feedback.append("❌ No special characters")
+    if classes["longest_run"] >= 3:
+        kinds.add("repeat")
+    for kind in ("dictionary", "leet", "keyboard", "sequence", "repeat"):
+        if kind in kinds:
+            feedback.append(PATTERN_FEEDBACK[kind])
 
-    common_patterns = ['password', '123456', 'qwerty', 'admin', 'letmein']
-    if any(pattern in password.lower() for pattern in common_patterns):
-        score -= 15
-        feedback.append("⚠️ Contains common patterns")
-    
-    score = max(0, min(100, score))
-    
     if score >= 80:
         strength = "STRONG"
         emoji = "✅"
@@ -117,52 +499,230 @@ def analyze_password_strength(password: str):
         "score": score,
         "strength": strength,
         "emoji": emoji,
+        "entropy_bits": round(bits, 1),
+        "crack_time": _crack_time(bits),
         "feedback": feedback if feedback else ["✅ Good password!"],
         "message": f"{emoji} Password strength: {strength} ({score}/100)"
     }
 
 
+def analyze_password_strength_batch(passwords):
+    """Score many passwords at once (e.g. a bulk audit); duplicates are scored once"""
+    seen = {}
+    results = []
+    for password in passwords:
+        result = seen.get(password)
+        if result is None:
+            result = seen[password] = analyze_password_strength(password)
+        results.append(result)
+    return results
+
+
+PWNED_RANGE_URL = "https://api.pwnedpasswords.com/range/{}"
+PWNED_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class PwnedAPIError(Exception):
+    """Non-200 answer from the pwnedpasswords range API"""
+
+    def __init__(self, status_code):
+        super().__init__(f"API error: {status_code}")
+        self.status_code = status_code
+
+
+class PwnedRangeCache:
+    """k-anonymity range responses by 5-char prefix: in-memory LRU plus an optional directory on disk"""
+
+    def __init__(self, max_entries=256, cache_dir=None, disk_ttl=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.disk_ttl = disk_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, prefix):
+        with self._lock:
+            body = self._entries.get(prefix)
+            if body is not None:
+                self._entries.move_to_end(prefix)
+                return body
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, prefix)
+            try:
+                if time.time() - os.path.getmtime(path) < self.disk_ttl:
+                    with open(path, "r", encoding="ascii", newline="") as f:
+                        body = f.read()
+                    self._remember(prefix, body)
+                    return body
+            except OSError:
+                pass
+        return None
+
+    def put(self, prefix, body):
+        self._remember(prefix, body)
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, prefix)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="ascii", newline="") as f:
+                    f.write(body)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("⚠️ Could not write pwned range cache %s: %s", path, e)
+
+    def _remember(self, prefix, body):
+        with self._lock:
+            self._entries[prefix] = body
+            self._entries.move_to_end(prefix)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class PwnedHashFile:
+    """Offline lookups in a downloaded HIBP SHA-1 file.
+
+    The file must be the "ordered by hash" export: one HASH:COUNT per line,
+    sorted by hash. It is memory-mapped and binary-searched, so a lookup
+    touches a few pages and never loads the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+
+    def lookup(self, sha1_hex):
+        """Breach count for an uppercase SHA-1 hex digest (0 if absent)"""
+        target = sha1_hex.encode("ascii")
+        data = self._map
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = data.rfind(b"\n", 0, mid) + 1
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = len(data)
+            line_hash, _, count = data[start:end].strip().partition(b":")
+            if line_hash == target:
+                return int(count)
+            if line_hash < target:
+                lo = end + 1
+            else:
+                hi = start
+        return 0
+
+
+class PwnedPasswordChecker:
+    """Breach counts from a local hash file, the range cache, or the API (in that order).
+
+    mode: "auto" uses the hash file when configured and the API otherwise,
+    "offline" never touches the network, "online" ignores the hash file.
+    """
+
+    def __init__(self, mode="auto", hash_file=None, cache=None, timeout=10):
+        self.mode = mode
+        self.timeout = timeout
+        self.cache = cache or PwnedRangeCache()
+        self.hash_file = None
+        if hash_file and mode != "online":
+            try:
+                self.hash_file = PwnedHashFile(hash_file)
+            except (OSError, ValueError) as e:
+                # ValueError: mmap of an empty file. Lookups fall back to the range API.
+                logger.warning("⚠️ Could not open pwned hash file %s: %s", hash_file, e)
+        self.session = requests.Session()
+        self.session.headers.update(PWNED_HEADERS)
+
+    def fetch_range(self, prefix):
+        body = self.cache.get(prefix)
+        if body is None:
+            def get_range(timeout):
+                response = self.session.get(PWNED_RANGE_URL.format(prefix), timeout=timeout)
+                if response.status_code != 200:
+                    raise PwnedAPIError(response.status_code)
+                return response.text
+
+            body = call_upstream(
+                "pwnedpasswords", get_range,
+                attempt_timeout=self.timeout,
+                retries=1,
+                retry_on=(requests.RequestException, PwnedAPIError),
+            )
+            self.cache.put(prefix, body)
+        return body
+
+    def count(self, sha1_hex):
+        """How many times the password with this SHA-1 appears in known breaches"""
+        if self.hash_file is not None:
+            return self.hash_file.lookup(sha1_hex)
+        if self.mode == "offline":
+            raise RuntimeError("offline mode, but no pwned hash file is configured")
+
+        prefix, suffix = sha1_hex[:5], sha1_hex[5:]
+        body = self.fetch_range(prefix)
+        position = body.find(suffix + ":")
+        # Suffixes are fixed-width, so a match must start a line.
+        if position == -1 or (position > 0 and body[position - 1] != "\n"):
+            return 0
+        end = body.find("\n", position)
+        return int(body[position + len(suffix) + 1:end if end != -1 else None].strip())
+
+
+pwned_checker = PwnedPasswordChecker(
+    mode=os.environ.get("PWNED_MODE", "auto"),
+    hash_file=os.environ.get("PWNED_HASH_FILE"),
+    cache=PwnedRangeCache(
+        max_entries=int(os.environ.get("PWNED_CACHE_SIZE", 256)),
+        cache_dir=os.environ.get("PWNED_CACHE_DIR"),
+    ),
+)
+
+
 def check_password_breach(password: str) -> dict:
     """
     Check if a password has been leaked in data breaches (FREE API, no key needed).
     """
     try:
         sha1_password = hashlib.sha1(password.encode()).hexdigest().upper()
-        prefix = sha1_password[:5]
-        suffix = sha1_password[5:]
-
-        url = f"https://api.pwnedpasswords.com/range/{prefix}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-
-        if response.status_code == 200:
-            for line in response.text.split('\r\n'):
-                if ':' in line:
-                    hash_suffix, count = line.split(':')
-                    if hash_suffix == suffix:
-                        return {
-                            "status": "COMPROMISED",
-                            "found": int(count),
-                            "message": f"🚨 THIS PASSWORD WAS FOUND IN {count} BREACHES! CHANGE IT IMMEDIATELY."
-                        }
+        count = pwned_checker.count(sha1_password)
 
+        if count:
             return {
-                "status": "SAFE",
-                "found": 0,
-                "message": "✅ Good news! This password wasn't found in any known breaches."
-            }
-        else:
-            print(f"   [check_password_breach] API ERROR: {response.status_code}")
-            return {
-                "status": "ERROR",
-                "message": f"⚠️ API error: {response.status_code}",
-                "found": 0
+                "status": "COMPROMISED",
+                "found": count,
+                "message": f"🚨 THIS PASSWORD WAS FOUND IN {count} BREACHES! CHANGE IT IMMEDIATELY."
             }
 
+        return {
+            "status": "SAFE",
+            "found": 0,
+            "message": "✅ Good news! This password wasn't found in any known breaches."
+        }
+
+    except UpstreamUnavailable as e:
+        logger.info("[check_password_breach] %s", e)
+        return {
+            "status": "ERROR",
+            "message": "⚠️ Breach database unreachable right now, try again later",
+            "found": 0
+        }
+    except PwnedAPIError as e:
+        logger.info("[check_password_breach] API ERROR: %s", e.status_code)
+        return {
+            "status": "ERROR",
+            "message": f"⚠️ API error: {e.status_code}",
+            "found": 0
+        }
     except Exception as e:
-        print(f"   [check_password_breach] EXCEPTION: {e}")
+        logger.info("[check_password_breach] EXCEPTION: %s", e)
         return {
             "status": "ERROR",
             "message": f"⚠️ Error: {str(e)}",
@@ -299,4 +859,55 @@ def google_dorking_search(target: str):
         "target": query,
         "results": results,
         "message": f"🔍 Generated OSINT dorks for: {query}"
-    }
\ No newline at end of file
+    }
+
+
+# Chat box commands (routed by command_router; OSINT search and help live in app2)
+
+@command_router.command("password_checker", prefixes=["check password"],
+                        usage="/check password [pass]", summary="to audit your leaks")
+def password_strength_command(password):
+    if not password:
+        return {
+            "response": "Usage: check password your_password_here",
+            "tool": "password_checker",
+            "error": "No password provided"
+        }
+
+    logger.info("🔐 PASSWORD STRENGTH CHECK")
+    result = analyze_password_strength(password)
+    logger.debug("Score: %s/100", result['score'])
+    logger.debug("Strength: %s", result['strength'])
+    logger.debug("Feedback: %s", result['feedback'])
+
+    return {
+        "response": result['message'],
+        "tool": "password_checker",
+        "data": result
+    }
+
+
+@command_router.command("security_news", exact=["security news", "hacker news"], cost=IO,
+                        usage="/security news", summary="for threats")
+def security_news_command(_):
+    logger.info("🥷🏽💻 FETCHING SECURITY NEWS")
+    result = get_security_news()
+    return {
+        "response": result['message'],
+        "tool": "security_news",
+        "data": result
+    }
+
+
+# The whole message: "surveillance", "/surveillance", "show me the cameras!"
+@command_router.command("surveillance",
+                        pattern=r"/?(?:surveil+ance|survelliance)|show\s+(?:me\s+)?(?:the\s+)?(?:surveil+ance|cameras?)",
+                        usage="/surveillance", summary="to peek through cameras")
+def surveillance_command(_):
+    logger.info("👁️ SURVEILLANCE FEED REQUESTED")
+    result = get_surveillance_camera()
+    return {
+        "response": result['message'],
+        "tool": "surveillance",
+        "data": result
+    }
@@ -0,0 +1,157 @@
+"""BM25 retrieval and canonicalization for a user's topic summaries.
+
+Only the topics relevant to the current message go into the system prompt,
+so the prompt stays the same size however many topics a visitor piles up.
+New topics that are just another name for an existing one ("feminist_theory"
+vs "feminism") are folded into it instead of becoming a new key.
+Pure Python: a user has tens of topics, not thousands, and building the
+index is cheaper than a single JSON decode of the row.
+"""
+import math
+import re
+from collections import Counter
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can do for from have how i if in is it its me my
+no not of on or so that the this to was we what when where which who why will
+with you your about just like they them there than then
+и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по
+только ее мне было вот от меня еще нет о из ему теперь когда даже ну вдруг ли
+если уже или ни быть был него до вас нибудь опять уж вам ведь там потом себя
+""".split())
+
+# Crude English suffix stripping, enough to make feminism/feminist/feminists meet
+SUFFIXES = ("isms", "ists", "ions", "ism", "ist", "ity", "ing", "ion", "al", "es", "s")
+
+# A new topic joins an existing one at this similarity (0..1)
+NAME_MATCH = 0.5
+CONTENT_MATCH = 0.45
+
+# Standard BM25 parameters
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords; topic_names_like_this split on '_'"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def topic_document(name, data):
+    """Text a topic is matched on: its name, summary, positions and key points"""
+    parts = [name, data.get("summary", "")]
+    parts.extend(data.get("key_positions", []) or [])
+    parts.extend(data.get("key_points", []) or [])
+    return " ".join(str(p) for p in parts)
+
+
+class TopicIndex:
+    """BM25 index over {topic_name: topic_data}."""
+
+    def __init__(self, topics):
+        self.names = list(topics)
+        self.term_freqs = [Counter(tokenize(topic_document(n, topics[n]))) for n in self.names]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(self.names)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query):
+        """BM25 score of every topic for query, in index order"""
+        terms = [t for t in set(tokenize(query or "")) if t in self.idf]
+        result = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = K1 * (1 - B + B * length / self.avg_length) if self.avg_length else K1
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (K1 + 1) / (freq + norm)
+            result.append(score)
+        return result
+
+    def search(self, query, k):
+        """Names of up to k topics with a positive score, best first"""
+        ranked = sorted(zip(self.scores(query), range(len(self.names))), key=lambda p: (-p[0], p[1]))
+        return [self.names[i] for score, i in ranked[:k] if score > 0]
+
+
+def select_topics(topics, query, k):
+    """Pick at most k topic names for the prompt.
+
+    Topics matching query come first; the remaining slots go to the most
+    recently discussed topics, so the visitor's current thread is never lost.
+    """
+    if len(topics) <= k:
+        return list(topics)
+    chosen = TopicIndex(topics).search(query, k)
+    if len(chosen) < k:
+        recent = sorted(topics, key=lambda n: topics[n].get("last_discussed") or "", reverse=True)
+        chosen += [n for n in recent if n not in chosen][:k - len(chosen)]
+    return chosen
+
+
+def canonical_topic_name(raw):
+    """Topic key from a model-given name: 'Feminist Theory!' -> 'feminist_theory'"""
+    return "_".join(TOKEN_RE.findall((raw or "").lower()))
+
+
+def stem(token):
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+            return token[:-len(suffix)]
+    return token
+
+
+def _stems(text):
+    return Counter(stem(t) for t in tokenize(text))
+
+
+def _cosine(a, b):
+    dot = sum(count * b.get(term, 0) for term, count in a.items())
+    if not dot:
+        return 0.0
+    return dot / math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+
+
+def match_existing_topic(name, topic_data, topics):
+    """Name of the existing topic this one is a variant of, or None"""
+    if name in topics:
+        return name
+    name_stems = set(_stems(name))
+    content = _stems(topic_document(name, topic_data))
+    best, best_score = None, 0.0
+    for existing, data in topics.items():
+        existing_stems = set(_stems(existing))
+        union = name_stems | existing_stems
+        name_score = len(name_stems & existing_stems) / len(union) if union else 0.0
+        if name_score >= NAME_MATCH:
+            score = 1.0 + name_score
+        else:
+            score = _cosine(content, _stems(topic_document(existing, data)))
+            if score < CONTENT_MATCH:
+                continue
+        if score > best_score:
+            best, best_score = existing, score
+    return best
+
+
+def merge_points(existing, new, cap):
+    """Append new items to existing without duplicates (case and spacing ignored).
+
+    A repeated item moves to the end; when over cap the oldest items are dropped.
+    """
+    merged = {}
+    for item in list(existing or []) + list(new or []):
+        if not isinstance(item, str) or not item.strip():
+            continue
+        key = " ".join(item.lower().split())
+        merged.pop(key, None)
+        merged[key] = item.strip()
+    items = list(merged.values())
+    return items[-cap:] if cap else items
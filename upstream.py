@@ -0,0 +1,195 @@
+"""Calls to slow or flaky upstreams (Anthropic, RSS feeds, HIBP) with a hard time ceiling.
+
+call_upstream runs one call with:
+- a per-attempt timeout that never outlives the request's Deadline,
+- a few retries with jittered exponential backoff for transient errors,
+- a circuit breaker per upstream, so a dead dependency fails fast instead of
+  tying up a worker for every visitor. A call that gives up counts as one
+  failure however many attempts it made; "busy" answers (429) count as none.
+
+When everything fails it raises UpstreamUnavailable; callers pick the
+fallback (a canned reply, the cached news list, ...).
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream failed, timed out, or its circuit is open."""
+
+    def __init__(self, name, reason):
+        super().__init__(f"{name} unavailable: {reason}")
+        self.name = name
+        self.reason = reason
+
+
+class Deadline:
+    """Time budget for a whole request, shared by all the upstream calls it makes."""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_timeout one trial call is let through."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("✅ Circuit for %s closed again", self.name)
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.info("⚡ Circuit for %s opened after %s failures", self.name, self.failures)
+                self.opened_at = time.monotonic()
+
+
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, failure_threshold=5, reset_timeout=30.0):
+    """The process-wide breaker for an upstream, created on first use"""
+    with _breakers_lock:
+        if name not in breakers:
+            breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+        return breakers[name]
+
+
+def breaker_states():
+    with _breakers_lock:
+        items = list(breakers.items())
+    return {name: {"state": b.state, "failures": b.failures} for name, b in items}
+
+
+def _admit(name, breaker, deadline):
+    """Once per call: fail fast on a passed deadline or an open circuit"""
+    if deadline is not None and deadline.expired():
+        raise UpstreamUnavailable(name, "request deadline passed")
+    if not breaker.allow():
+        raise UpstreamUnavailable(name, "circuit open")
+
+
+def _attempt_timeout(attempt_timeout, deadline):
+    return attempt_timeout if deadline is None else min(attempt_timeout, deadline.remaining())
+
+
+def _backoff(attempt, backoff, deadline):
+    """Seconds to sleep before the next attempt, or None if there is no time left for one"""
+    delay = backoff * (2 ** attempt) * (0.5 + random.random())
+    if deadline is not None and deadline.remaining() <= delay + 1.0:
+        return None
+    return delay
+
+
+def _settle(breaker, failed):
+    """Report a finished call to the breaker: one failure per call, however many attempts it took"""
+    if failed:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def call_upstream(name, func, deadline=None, attempt_timeout=30.0, retries=2, backoff=0.3,
+                  retry_on=(Exception,), busy_on=()):
+    """Run func(timeout) against upstream name. See the module docstring.
+
+    busy_on: retryable errors that mean "busy", not "broken" (HTTP 429); they
+    never count against the breaker.
+    """
+    breaker = get_breaker(name)
+    _admit(name, breaker, deadline)
+    attempt = 0
+    failed = False
+    while True:
+        try:
+            result = func(_attempt_timeout(attempt_timeout, deadline))
+        except retry_on as e:
+            failed = failed or not isinstance(e, busy_on)
+            delay = _backoff(attempt, backoff, deadline) if attempt < retries else None
+            if delay is None:
+                _settle(breaker, failed)
+                raise UpstreamUnavailable(name, f"{type(e).__name__}: {e}") from e
+            attempt += 1
+            logger.warning("⚠️ %s failed (%s), retry %s in %.1fs", name, type(e).__name__, attempt, delay)
+            time.sleep(delay)
+            continue
+        except Exception:
+            # The upstream answered (e.g. a 400); that says nothing about its health.
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def acall_upstream(name, func, deadline=None, attempt_timeout=30.0, retries=2, backoff=0.3,
+                         retry_on=(Exception,), busy_on=()):
+    """call_upstream for coroutines: func(timeout) returns an awaitable"""
+    breaker = get_breaker(name)
+    _admit(name, breaker, deadline)
+    attempt = 0
+    failed = False
+    while True:
+        try:
+            result = await func(_attempt_timeout(attempt_timeout, deadline))
+        except retry_on as e:
+            failed = failed or not isinstance(e, busy_on)
+            delay = _backoff(attempt, backoff, deadline) if attempt < retries else None
+            if delay is None:
+                _settle(breaker, failed)
+                raise UpstreamUnavailable(name, f"{type(e).__name__}: {e}") from e
+            attempt += 1
+            logger.warning("⚠️ %s failed (%s), retry %s in %.1fs", name, type(e).__name__, attempt, delay)
+            await asyncio.sleep(delay)
+            continue
+        except Exception:
+            # The upstream answered (e.g. a 400); that says nothing about its health.
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result